@@ -0,0 +1,82 @@
+"""
+Times a cold start of the bot in a fresh process: interpreter start, imports, database setup
+and loading every extension. With TOKEN set it also times the whole way to on_ready, which
+includes logging in to Discord.
+
+Run from the repository root with:
+    python -m benchmarks.cold_start_benchmark
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bot import READY_MESSAGE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_ONLY = "import bot; bot.create_bot()"
+# Never import these at startup, they're only needed once a puzzle is fetched or drawn
+HEAVY_MODULES = ("PIL", "bs4", "lxml", "playwright", "cProfile", "tracemalloc")
+HEAVY_CHECK = LOAD_ONLY + f"; import sys; print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+
+
+def _run(args, cwd: str, ready_line: str = None, timeout: float = 60) -> float:
+  """Returns the milliseconds from spawning a process until it exits, or prints ready_line."""
+  env = {**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1"}
+  start = time.perf_counter()
+  process = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, text=True)
+  try:
+    if ready_line is None:
+      process.communicate(timeout=timeout)
+      if process.returncode:
+        raise RuntimeError(f"{args} exited with {process.returncode}")
+      return (time.perf_counter() - start) * 1000
+    for line in process.stdout:
+      if line.startswith(ready_line):
+        return (time.perf_counter() - start) * 1000
+    raise RuntimeError(f"{args} exited before printing {ready_line!r}")
+  finally:
+    process.kill()
+    process.wait()
+
+
+def timeColdStart(runs: int = 5, to_ready: bool = False) -> float:
+  """Median milliseconds from process start to the extensions being loaded, or to on_ready."""
+  # A scratch directory, so each run sets up an empty database of its own
+  with tempfile.TemporaryDirectory() as cwd:
+    times = []
+    for _ in range(runs):
+      if to_ready:
+        times.append(_run([sys.executable, os.path.join(ROOT, "bot.py")], cwd, READY_MESSAGE))
+      else:
+        times.append(_run([sys.executable, "-c", LOAD_ONLY], cwd))
+      os.remove(os.path.join(cwd, "bot_data.db"))
+    return statistics.median(times)
+
+
+def heavyModulesAtStartup() -> list[str]:
+  """The HEAVY_MODULES that loading the bot imported."""
+  with tempfile.TemporaryDirectory() as cwd:
+    output = subprocess.run(
+      [sys.executable, "-c", HEAVY_CHECK], cwd=cwd, env={**os.environ, "PYTHONPATH": ROOT},
+      capture_output=True, text=True, check=True
+    ).stdout
+  return output.split()
+
+
+def main():
+  baseline = _run([sys.executable, "-c", "import discord"], ROOT)
+  print(f"{'import discord only':<28} {baseline:>8.0f} ms")
+  print(f"{'extensions loaded':<28} {timeColdStart():>8.0f} ms")
+  if os.environ.get("TOKEN"):
+    print(f"{'on_ready':<28} {timeColdStart(3, to_ready=True):>8.0f} ms")
+  else:
+    print("Set TOKEN to also time startup up to on_ready")
+  heavy = heavyModulesAtStartup()
+  print(f"Heavy modules imported at startup: {', '.join(heavy) or 'none'}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,13 @@
+# benchmarks/cold_start_benchmark_test.py
+import sys
+
+import pytest
+
+from benchmarks.cold_start_benchmark import LOAD_ONLY, _run
+
+pytestmark = pytest.mark.benchmark
+
+
+def test_cold_start(timer, tmp_path):
+  # Each run is a whole new interpreter, so once per round is plenty
+  timer(lambda: _run([sys.executable, "-c", LOAD_ONLY], str(tmp_path)), repeats=1)
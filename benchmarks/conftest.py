@@ -0,0 +1,101 @@
+"""
+Benchmarks only run when asked for:
+
+    python -m pytest benchmarks -m benchmark
+
+Each one is compared with its time in baselines.json and fails if it is more than
+CROSSWORD_BENCHMARK_THRESHOLD times slower (1.5 by default). One that looks slow is measured
+again before it fails, so a burst of load on the machine doesn't fail the run. Baselines depend
+on the machine, so refresh them after a deliberate change or on new hardware with
+CROSSWORD_BENCHMARK_UPDATE=1.
+"""
+import json
+import os
+import time
+
+import pytest
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+THRESHOLD = float(os.environ.get("CROSSWORD_BENCHMARK_THRESHOLD", "1.5"))
+UPDATE_BASELINES = os.environ.get("CROSSWORD_BENCHMARK_UPDATE") == "1"
+# Differences this small are timer noise, whatever the baseline
+NOISE_MS = 1.0
+# Each benchmark is the best of this many rounds, which is steadier than the mean
+ROUNDS = 10
+# Times a benchmark over its limit is measured again, keeping the best, before it fails
+ATTEMPTS = 3
+
+
+def pytest_collection_modifyitems(config, items):
+  # Left out of every run that doesn't select them by marker, like -m "not integration"
+  if "benchmark" in config.getoption("markexpr"):
+    return
+  skipped = [item for item in items if item.get_closest_marker("benchmark")]
+  if skipped:
+    items[:] = [item for item in items if item not in skipped]
+    config.hook.pytest_deselected(items=skipped)
+
+
+@pytest.fixture(scope="session")
+def baselines():
+  try:
+    with open(BASELINES_FILE, "r") as f:
+      stored = json.load(f)
+  except FileNotFoundError:
+    stored = {}
+  measured = {}
+  yield stored, measured
+
+  if UPDATE_BASELINES and measured:
+    with open(BASELINES_FILE, "w") as f:
+      json.dump({**stored, **measured}, f, indent=2, sort_keys=True)
+      f.write("\n")
+
+
+class Timer:
+  """Times a benchmark's function and checks the result against its baseline."""
+
+  def __init__(self, name: str, baselines):
+    self.name = name
+    self.stored, self.measured = baselines
+
+  def _within_baseline(self, ms: float) -> bool:
+    baseline = self.stored.get(self.name)
+    return baseline is None or UPDATE_BASELINES or ms <= baseline * THRESHOLD + NOISE_MS
+
+  def _check(self, ms: float) -> float:
+    self.measured[self.name] = round(ms, 4)
+    baseline = self.stored.get(self.name)
+    assert self._within_baseline(ms), f"{self.name} took {ms:.3f} ms, baseline is {baseline:.3f} ms"
+    return ms
+
+  def __call__(self, fn, repeats: int = 10) -> float:
+    """Returns the best mean time of fn() in milliseconds."""
+    best = float("inf")
+    for _ in range(ATTEMPTS):
+      for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(repeats):
+          fn()
+        best = min(best, (time.perf_counter() - start) * 1000 / repeats)
+      if self._within_baseline(best):
+        break
+    return self._check(best)
+
+  async def run_async(self, fn, repeats: int = 10) -> float:
+    """Same as calling the timer, for coroutine functions."""
+    best = float("inf")
+    for _ in range(ATTEMPTS):
+      for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(repeats):
+          await fn()
+        best = min(best, (time.perf_counter() - start) * 1000 / repeats)
+      if self._within_baseline(best):
+        break
+    return self._check(best)
+
+
+@pytest.fixture
+def timer(request, baselines):
+  return Timer(request.node.name, baselines)
@@ -0,0 +1,49 @@
+"""
+Compares the image formats in draw_crossword.IMAGE_FORMATS on a half-solved sample puzzle.
+
+Run from the repository root with:
+    python -m benchmarks.encoding_benchmark
+"""
+import contextlib
+import io
+import time
+
+from cogs.crossword.draw_crossword import IMAGE_FORMATS, drawClues, drawCrossword, encodeImage
+from cogs.crossword.getMetro import parsePuzzle
+
+
+def loadHalfSolvedSample():
+  fragments = []
+  for name in ("puzzle_grid.html", "across_clues.html", "down_clues.html"):
+    with open(f"tests/samples/{name}", "r") as f:
+      fragments.append(f.read())
+  with contextlib.redirect_stdout(io.StringIO()):
+    grid, clues = parsePuzzle(*fragments)
+  for ref in list(clues)[::2]:
+    clues[ref]["status"] = "solved"
+    for x, y in clues[ref]["cells"]:
+      grid.set_letter(x, y, "E")
+  return grid, clues
+
+
+def timeEncodes(image, image_format: str, repeats: int = 20):
+  """Returns the mean encode time in milliseconds and the encoded size in bytes."""
+  data = encodeImage(image, image_format)
+  start = time.perf_counter()
+  for _ in range(repeats):
+    encodeImage(image, image_format)
+  return (time.perf_counter() - start) * 1000 / repeats, len(data)
+
+
+def main():
+  grid, clues = loadHalfSolvedSample()
+  images = {"grid": drawCrossword(grid), "clues": drawClues(clues)}
+  print(f"{'image':>6} {'format':>8} {'encode (ms)':>12} {'size (KB)':>10}")
+  for name, image in images.items():
+    for image_format in IMAGE_FORMATS:
+      ms, size = timeEncodes(image, image_format)
+      print(f"{name:>6} {image_format:>8} {ms:>12.2f} {size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+  main()
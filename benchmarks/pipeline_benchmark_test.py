@@ -0,0 +1,116 @@
+# benchmarks/pipeline_benchmark_test.py
+import contextlib
+import io
+
+import pytest
+
+import database as db
+from benchmarks.synthetic import cluesHTML, gridHTML, makeSyntheticClues, makeSyntheticGrid
+from cogs.crossword.draw_crossword import (
+  CLUES_IMAGE_FORMAT, GRID_IMAGE_FORMAT, drawClues, drawCrossword, encodeImage, encodePNG, getRenderContext
+)
+from cogs.crossword.getMetro import cluesToDic, findCellInfo, getClues, parsePuzzle
+
+pytestmark = pytest.mark.benchmark
+
+PUZZLES = ["sample", "15x15", "21x21", "25x25", "31x17", "41x41"]
+
+
+def read_sample(name):
+  with open(f"tests/samples/{name}", "r") as f:
+    return f.read()
+
+
+@pytest.fixture(scope="module", params=PUZZLES)
+def puzzle(request):
+  """The HTML fragments of a puzzle along with what parsing them gives."""
+  if request.param == "sample":
+    fragments = read_sample("puzzle_grid.html"), read_sample("across_clues.html"), read_sample("down_clues.html")
+  else:
+    width, height = (int(side) for side in request.param.split("x"))
+    grid = makeSyntheticGrid(width, fill=0, height=height)
+    across, down = makeSyntheticClues(grid)
+    fragments = gridHTML(grid), cluesHTML(across, "A"), cluesHTML(down, "D")
+
+  with contextlib.redirect_stdout(io.StringIO()):
+    grid, clues = parsePuzzle(*fragments)
+  # Half the answers in, for drawing
+  for ref in list(clues)[::2]:
+    clues[ref]["status"] = "solved"
+    for x, y in clues[ref]["cells"]:
+      grid.set_letter(x, y, "E")
+  return fragments, grid, clues
+
+
+@pytest.fixture(scope="module", autouse=True)
+def render_context():
+  # Font loading is a one off at startup, so keep it out of the render timings
+  return getRenderContext()
+
+
+def test_find_cell_info(puzzle, timer):
+  (puzzle_html, _, _), _, _ = puzzle
+  timer(lambda: findCellInfo(puzzle_html))
+
+
+def test_get_clues(puzzle, timer):
+  (_, across_html, down_html), _, _ = puzzle
+  timer(lambda: (getClues(across_html, "A"), getClues(down_html, "D")))
+
+
+def test_parse_puzzle_lxml(puzzle, timer):
+  fragments, _, _ = puzzle
+  with contextlib.redirect_stdout(io.StringIO()):
+    timer(lambda: parsePuzzle(*fragments, parser="lxml"))
+
+
+def test_clues_to_dic(puzzle, timer):
+  (_, across_html, down_html), grid, _ = puzzle
+  clues = getClues(down_html, "D") + getClues(across_html, "A")
+  with contextlib.redirect_stdout(io.StringIO()):
+    timer(lambda: cluesToDic(clues, grid), repeats=50)
+
+
+def test_draw_crossword(puzzle, timer):
+  _, grid, _ = puzzle
+  timer(lambda: drawCrossword(grid), repeats=20)
+
+
+def test_draw_clues(puzzle, timer):
+  _, _, clues = puzzle
+  timer(lambda: drawClues(clues), repeats=5)
+
+
+def test_encode_png(puzzle, timer):
+  _, grid, clues = puzzle
+  grid_image, clues_image = drawCrossword(grid), drawClues(clues)
+  timer(lambda: (encodePNG(grid_image), encodePNG(clues_image)), repeats=5)
+
+
+def test_encode_configured_formats(puzzle, timer):
+  _, grid, clues = puzzle
+  grid_image, clues_image = drawCrossword(grid), drawClues(clues)
+  timer(lambda: (encodeImage(grid_image, GRID_IMAGE_FORMAT), encodeImage(clues_image, CLUES_IMAGE_FORMAT)), repeats=5)
+
+
+async def test_database_round_trip(puzzle, timer, tmp_path, monkeypatch):
+  _, grid, clues = puzzle
+  monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "bot_data.db"))
+  db.setup_database()
+  store = db.AsyncDatabase()
+  thread_ids = iter(range(1, 1_000_000))
+
+  async def round_trip():
+    thread_id = next(thread_ids)
+    await store.create_puzzle(thread_id, thread_id, "2025-01-01", "benchmark", grid.width, grid.height, grid.copy(), clues)
+    state = await store.get_puzzle_state(thread_id)
+    ref, clue = next(iter(state["clues"].items()))
+    for x, y in clue["cells"]:
+      state["cells"].set_letter(x, y, "S")
+    clue["status"] = "solved"
+    await store.update_puzzle_cells(thread_id, state, clue["cells"], [ref], expected_version=state["version"])
+
+  try:
+    await timer.run_async(round_trip)
+  finally:
+    await store.close()
@@ -0,0 +1,33 @@
+"""
+Times grid rendering on synthetic 13x13 and 21x21 puzzles.
+
+Run from the repository root with:
+    python -m benchmarks.render_benchmark
+"""
+import time
+
+from benchmarks.synthetic import makeSyntheticGrid
+from cogs.crossword.draw_crossword import RenderContext, drawCrossword, getRenderContext
+
+
+def timeRenders(render, repeats: int) -> float:
+  """Returns the mean time of one render in milliseconds."""
+  start = time.perf_counter()
+  for _ in range(repeats):
+    render()
+  return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main():
+  # Warm the shared context so font loading isn't counted
+  getRenderContext()
+  print(f"{'grid':>6} {'cold context (ms)':>18} {'shared context (ms)':>20}")
+  for size in (13, 21):
+    grid = makeSyntheticGrid(size)
+    cold = timeRenders(lambda: drawCrossword(grid, RenderContext()), 20)
+    warm = timeRenders(lambda: drawCrossword(grid), 200)
+    print(f"{size}x{size:<3} {cold:>18.2f} {warm:>20.2f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,79 @@
+"""
+Synthetic puzzles for the benchmarks, in the same shapes the real pipeline produces.
+
+The grids use a regular pattern: every row and column with an even index is one long
+answer and the cells where two odd ones meet are blank.
+"""
+import html
+import random
+
+from cogs.crossword.grid import Grid
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def makeSyntheticGrid(size: int, fill: float = 0.6, seed: int = 0, height: int = None) -> Grid:
+  """Builds a size x size grid, or size x height, with a regular blank pattern, partly filled with letters."""
+  rng = random.Random(seed)
+  height = height or size
+  grid = Grid(size, height)
+  label = 0
+  for y in range(height):
+    for x in range(size):
+      blank = x % 2 == 1 and y % 2 == 1
+      grid.set_blank(x, y, blank)
+      # Numbered where an across or down answer starts
+      if not blank and ((x == 0 and y % 2 == 0) or (y == 0 and x % 2 == 0)):
+        label += 1
+        grid.set_label(x, y, label)
+      if not blank and rng.random() < fill:
+        grid.set_letter(x, y, rng.choice(LETTERS))
+  return grid
+
+
+def _lengthText(length: int) -> str:
+  # Longer answers are split in two, like multi-word answers
+  if length > 8:
+    return f"({length // 2},{length - length // 2})"
+  return f"({length})"
+
+
+def makeSyntheticClues(grid: Grid):
+  """Returns (across, down) clue tuples for a synthetic grid, as getClues would."""
+  across, down = [], []
+  for x, y in grid.coords():
+    label = grid.label(x, y)
+    if label is None:
+      continue
+    if x == 0:
+      across.append((label, f"Synthetic across clue number {label} {_lengthText(grid.width)}", "A"))
+    if y == 0:
+      down.append((label, f"Synthetic down clue number {label} {_lengthText(grid.height)}", "D"))
+  return across, down
+
+
+def gridHTML(grid: Grid) -> str:
+  """Renders a grid as the Metro site's puzzle table."""
+  rows = []
+  for y in range(grid.height):
+    cells = []
+    for x in range(grid.width):
+      state = "inactive" if grid.is_blank(x, y) else "active"
+      label = grid.label(x, y) or "&nbsp;"
+      cells.append(
+        f'<td class="cell {state}" data-index="{grid.index(x, y)}"><span class="cell-label">{label}</span>'
+        '<span class="cell-content">&nbsp;</span></td>'
+      )
+    rows.append(f'<tr class="grid-row">{"".join(cells)}</tr>')
+  return f'<table><tbody>{"".join(rows)}</tbody></table>'
+
+
+def cluesHTML(clues, direction: str) -> str:
+  """Renders clue tuples as one of the Metro site's clue lists."""
+  name = "across" if direction == "A" else "down"
+  items = "".join(
+    f'<li class="clue-container" tab-index="-1" aria-label="{number} {name} - {html.escape(text)}" value="{number}">'
+    f'<span lang="en">{html.escape(text)}</span></li>'
+    for number, text, _ in clues
+  )
+  return f'<h2 class="clue-list-header">{name.upper()}</h2><ol class="clue-list-scroll" aria-label="{name} clues" tab-index="0">{items}</ol>'
@@ -1,22 +1,49 @@
 # main.py
 import os
+import time
 import discord
 from dotenv import load_dotenv
 import database as db
 
-load_dotenv()
-TOKEN = os.getenv('TOKEN')
-# Run the database setup function once on startup
-db.setup_database()
+# Printed when the bot is ready, see benchmarks/cold_start_benchmark.py
+READY_MESSAGE = "Bot is ready and online!"
+EXTENSIONS = ["cogs.crossword.crossword_cog", "cogs.misc.misc_cog"]
 
-bot = discord.Bot(intents=discord.Intents.default())
 
-@bot.event
-async def on_ready():
-    print("Bot is ready and online!")
+class CrosswordBot(discord.Bot):
+    async def close(self):
+        # bot.run stops on SIGINT/SIGTERM without unloading cogs, so cog_unload never runs on a
+        # restart. Cogs with progress to save get to write it here, before disconnecting.
+        for cog in list(self.cogs.values()):
+            save_progress = getattr(cog, "save_progress", None)
+            if save_progress is None:
+                continue
+            try:
+                await save_progress()
+            except Exception as e:
+                print(f"[WARNING] Saving progress of {cog.qualified_name} failed: {e}")
+        await super().close()
 
-# Load the cogs
-bot.load_extension("cogs.crossword.crossword_cog")
-bot.load_extension("cogs.misc.misc_cog")
 
-bot.run(TOKEN)
+def create_bot() -> discord.Bot:
+    """Sets up the database and returns the bot with every extension loaded."""
+    started = time.perf_counter()
+    load_dotenv()
+    # Run the database setup function once on startup
+    db.setup_database()
+
+    bot = CrosswordBot(intents=discord.Intents.default())
+
+    @bot.event
+    async def on_ready():
+        print(f"{READY_MESSAGE} ({(time.perf_counter() - started) * 1000:.0f} ms after setup started)")
+
+    # Load the cogs
+    for extension in EXTENSIONS:
+        bot.load_extension(extension)
+    return bot
+
+
+if __name__ == "__main__":
+    bot = create_bot()
+    bot.run(os.getenv('TOKEN'))
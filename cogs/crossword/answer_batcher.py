@@ -0,0 +1,79 @@
+import asyncio
+
+# Longest window a thread can ask for, so an update is never held back for long
+MAX_WINDOW_SECONDS = 10.0
+
+
+class AnswerBurst:
+  """Answers that arrived in one thread during a single window."""
+  __slots__ = ("channel", "cells", "answers")
+
+  def __init__(self, channel):
+    self.channel = channel
+    self.cells: set[tuple[int, int]] = set()
+    # (contributor, clue, answer) in the order they came in
+    self.answers: list[tuple[str, str, str]] = []
+
+  @property
+  def contributors(self) -> list[str]:
+    """Everyone who answered in this burst, once each, in order."""
+    return list(dict.fromkeys(contributor for contributor, _, _ in self.answers))
+
+
+class AnswerBatcher:
+  """
+  Collects answers per thread and hands them to publish() once a window has passed.
+
+  Threads opt in with enable(). The window starts at the first answer of a burst rather
+  than being pushed back by every new one, so a steady stream of answers still gets an
+  update at least every window seconds.
+  """
+
+  def __init__(self, publish):
+    # Awaited with (thread_id, AnswerBurst) at the end of each window
+    self.publish = publish
+    self.windows: dict[int, float] = {}
+    self._bursts: dict[int, AnswerBurst] = {}
+    self._tasks: dict[int, asyncio.Task] = {}
+
+  def enable(self, thread_id: int, seconds: float):
+    if not 0 < seconds <= MAX_WINDOW_SECONDS:
+      raise ValueError(f"The window has to be between 0 and {MAX_WINDOW_SECONDS:g} seconds")
+    self.windows[thread_id] = seconds
+
+  def disable(self, thread_id: int):
+    # Anything already waiting still goes out at the end of its window
+    self.windows.pop(thread_id, None)
+
+  def is_enabled(self, thread_id: int) -> bool:
+    return thread_id in self.windows
+
+  def pending(self, thread_id: int) -> int:
+    burst = self._bursts.get(thread_id)
+    return len(burst.answers) if burst else 0
+
+  def add(self, thread_id: int, channel, contributor: str, clue: str, answer: str, cells):
+    """Queues an answer that has already been applied to the puzzle."""
+    burst = self._bursts.get(thread_id)
+    if burst is None:
+      burst = self._bursts[thread_id] = AnswerBurst(channel)
+      window = self.windows.get(thread_id, 0)
+      self._tasks[thread_id] = asyncio.get_running_loop().create_task(self._publish_after(thread_id, window))
+    burst.cells.update(cells)
+    burst.answers.append((contributor, clue, answer))
+
+  async def _publish_after(self, thread_id: int, window: float):
+    await asyncio.sleep(window)
+    burst = self._bursts.pop(thread_id)
+    self._tasks.pop(thread_id, None)
+    try:
+      await self.publish(thread_id, burst)
+    except Exception as e:
+      print(f"[WARNING] Posting answers for thread {thread_id} failed: {e}")
+
+  def close(self):
+    """Drops any bursts still waiting. Their answers are already in the puzzle state."""
+    for task in self._tasks.values():
+      task.cancel()
+    self._tasks.clear()
+    self._bursts.clear()
@@ -0,0 +1,122 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+# Imported on the first launch, as most restarts never need a browser and Playwright is slow to import
+async_playwright = None
+
+# How many pages may be open at once across the whole bot
+MAX_CONTEXTS = 2
+# A context is thrown away and replaced after serving this many pages
+MAX_PAGES_PER_CONTEXT = 25
+
+
+def _async_playwright():
+  global async_playwright
+  if async_playwright is None:
+    from playwright.async_api import async_playwright
+  return async_playwright
+
+
+class _PooledContext:
+  """A browser context plus how many pages it has served."""
+  __slots__ = ("browser", "context", "pages_served")
+
+  def __init__(self, browser, context):
+    self.browser = browser
+    self.context = context
+    self.pages_served = 0
+
+
+class BrowserPool:
+  """
+  Keeps one Chromium instance warm and hands out pages from a bounded pool of contexts.
+
+  The browser is only launched the first time a page is requested. Contexts are reused
+  between commands and recycled once they have served `max_pages_per_context` pages, or
+  straight away if anything goes wrong while they are in use.
+  """
+
+  def __init__(self, max_contexts: int = MAX_CONTEXTS, max_pages_per_context: int = MAX_PAGES_PER_CONTEXT):
+    self.max_contexts = max_contexts
+    self.max_pages_per_context = max_pages_per_context
+    self._playwright = None
+    self._browser = None
+    self._start_lock = asyncio.Lock()
+    self._slots = asyncio.Semaphore(max_contexts)
+    self._idle: list[_PooledContext] = []
+
+  @property
+  def running(self) -> bool:
+    return self._browser is not None and self._browser.is_connected()
+
+  async def _ensure_browser(self):
+    """Launches Chromium if it isn't running, or relaunches it if it has died."""
+    async with self._start_lock:
+      if self.running:
+        return self._browser
+
+      # Anything left over belongs to a dead browser
+      await self._shutdown()
+      self._playwright = await _async_playwright()().start()
+      self._browser = await self._playwright.chromium.launch()
+      return self._browser
+
+  async def _acquire_context(self) -> _PooledContext:
+    browser = await self._ensure_browser()
+    while self._idle:
+      pooled = self._idle.pop()
+      if pooled.browser is browser:
+        return pooled
+      # Context from a previous browser, it can't be used anymore
+      await self._close_context(pooled)
+    return _PooledContext(browser, await browser.new_context())
+
+  @staticmethod
+  async def _close_context(pooled: _PooledContext):
+    try:
+      await pooled.context.close()
+    except Exception:
+      pass  # Browser may already be gone
+
+  @asynccontextmanager
+  async def page(self):
+    """Yields a fresh page from a pooled context, returning the context to the pool afterwards."""
+    async with self._slots:
+      pooled = await self._acquire_context()
+      page = await pooled.context.new_page()
+      healthy = False
+      try:
+        yield page
+        healthy = True
+      finally:
+        pooled.pages_served += 1
+        try:
+          await page.close()
+        except Exception:
+          healthy = False
+
+        if healthy and self.running and pooled.pages_served < self.max_pages_per_context:
+          self._idle.append(pooled)
+        else:
+          await self._close_context(pooled)
+
+  async def _shutdown(self):
+    for pooled in self._idle:
+      await self._close_context(pooled)
+    self._idle.clear()
+
+    if self._browser is not None:
+      try:
+        await self._browser.close()
+      except Exception:
+        pass
+      self._browser = None
+
+    if self._playwright is not None:
+      await self._playwright.stop()
+      self._playwright = None
+
+  async def close(self):
+    """Closes every context, the browser and the Playwright driver."""
+    async with self._start_lock:
+      await self._shutdown()
@@ -1,99 +1,479 @@
-from datetime import datetime
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
+import aiohttp
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import database as db
-from cogs.crossword.draw_crossword import drawClues, drawCrossword, getRelevantCells
-from cogs.crossword.getMetro import findMetroPuzzleHTML, findCellInfo, getClues, cluesToDic
-from PIL import Image
+from cogs.crossword.answer_batcher import MAX_WINDOW_SECONDS, AnswerBatcher, AnswerBurst
+from cogs.crossword.browser_pool import BrowserPool
+from cogs.crossword.draw_crossword import (
+  CLUES_IMAGE_FORMAT, GRID_IMAGE_FORMAT, ClueRenderer, GridRenderer, drawClues, drawCrossword, encodeImage, imageExtension
+)
+from cogs.crossword.getMetro import HTTP_HEADERS, HTTP_TIMEOUT
+from cogs.crossword.grid import Grid
+from cogs.crossword.image_cache import ImageCache, clues_image_key, grid_image_key
+from cogs.crossword.metrics import METRICS_FILE, METRICS_INTERVAL, metrics
+from cogs.crossword.profiling import PROFILE_SAMPLE_RATE, profiler
+from cogs.crossword.puzzle_cache import puzzle_cache
+from cogs.crossword.render_executor import RenderExecutor
+from cogs.crossword.send_queue import PRIORITY_FOLLOWUP, PRIORITY_INFO, SendQueue
+from cogs.crossword.sources import METRO_CRYPTIC, METRO_QUICK, SOURCES, PuzzleSource, get_source
+from cogs.crossword.state_cache import PuzzleStateCache
 import io
 
+# Threads whose grid and clue images are kept in memory between answers
+MAX_RETAINED_GRIDS = 50
+# Subscribed channels get the day's puzzle from this time on, local time as HH:MM
+POST_TIME = os.environ.get("CROSSWORD_POST_TIME", "08:00")
+# Subscribed channels posted to at once. Thread creation is rate limited per guild, so
+# going wider mostly means waiting on 429s.
+FANOUT_CONCURRENCY = int(os.environ.get("CROSSWORD_FANOUT_CONCURRENCY", "4"))
+
+
+def _today() -> str:
+  return datetime.now().strftime('%Y-%m-%d')
+
+
+def _day_before(puzzle_date: str) -> str:
+  return (datetime.strptime(puzzle_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _clue_texts(clues: dict) -> dict:
+  return {ref: clue["text"] for ref, clue in clues.items()}
+
+
+def _copy_clues(clues: dict) -> dict:
+  return {ref: dict(clue) for ref, clue in clues.items()}
+
+
 class CrosswordCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Chromium is started on the first fetch and kept warm between commands
+        self.browser_pool = BrowserPool()
+        # Rendered grid and clues per thread, so answers only repaint the cells and clues they change
+        self.grid_renderers: OrderedDict[int, GridRenderer] = OrderedDict()
+        self.clue_renderers: OrderedDict[int, ClueRenderer] = OrderedDict()
+        # Rendering and PNG encoding happen here instead of on the event loop
+        self.render_executor = RenderExecutor()
+        # Render jobs of a command being profiled are profiled in their worker as well
+        self.render_executor.job_wrapper = profiler.wrap
+        # Encoded images by content, shared by every thread showing the same picture
+        self.image_cache = ImageCache()
+        # Running puzzles are served from memory and written back in the background
+        self.puzzle_states = PuzzleStateCache()
+        # Another writer's answers were merged in, so the retained images are out of date
+        self.puzzle_states.on_reconcile = self._drop_renderers
+        # Threads that opted in get one combined update per burst of answers
+        self.answer_batcher = AnswerBatcher(self._publish_answers)
+        # Messages go out through a queue per channel, which backs off when Discord rate limits it
+        self.send_queue = SendQueue()
+        # Start times and profiling sessions of commands being handled, keyed by interaction id
+        self._command_started: dict[int, float] = {}
+        self._command_profiles = {}
+        # Subscribed channels the bot can't post in, left alone until the next day's puzzle
+        self._fanout_skipped: dict[str, set[int]] = {}
+        self.prefetch_puzzle.start()
+        self.persist_puzzles.start()
+        self.post_subscriptions.start()
+        if METRICS_FILE:
+          self.export_metrics.start()
+
+    def cog_unload(self):
+      self.prefetch_puzzle.cancel()
+      self.persist_puzzles.cancel()
+      self.post_subscriptions.cancel()
+      self.export_metrics.cancel()
+      self.answer_batcher.close()
+      self.send_queue.close()
+      # Pending tasks may be cancelled during shutdown, so this write can't be left to one
+      self.puzzle_states.flush_sync()
+      self.bot.loop.create_task(self.browser_pool.close())
+      self.render_executor.shutdown()
+      self.image_cache.close()
+      self.bot.loop.create_task(db.store.close())
+
+    async def save_progress(self):
+      """Writes every answer still held in memory. Called by the bot as it closes."""
+      try:
+        await self.puzzle_states.flush()
+      finally:
+        # Whatever the flush couldn't write, because it failed or shutdown cancelled it
+        self.puzzle_states.flush_sync()
+
+    async def cog_before_invoke(self, ctx: discord.ApplicationContext):
+      self._command_started[ctx.interaction.id] = time.perf_counter()
+      session = profiler.start(ctx.command.qualified_name)
+      if session is not None:
+        self._command_profiles[ctx.interaction.id] = session
+
+    async def cog_after_invoke(self, ctx: discord.ApplicationContext):
+      started = self._command_started.pop(ctx.interaction.id, None)
+      if started is not None:
+        metrics.observe(f"command.{ctx.command.qualified_name}", (time.perf_counter() - started) * 1000)
+
+      session = self._command_profiles.pop(ctx.interaction.id, None)
+      if session is not None:
+        try:
+          profiler.stop(session)
+        except OSError as e:
+          print(f"[WARNING] Writing profile of /{session.name} failed: {e}")
+
+    async def _load_puzzle(self, source: PuzzleSource, puzzle_date: str, session=None):
+      """Scrapes and parses the puzzle currently on the source's site for puzzle_date."""
+      with metrics.span("fetch"):
+        fragments = await source.fetch(pool=self.browser_pool, session=session)
+      with metrics.span("parse"):
+        puzzle = source.parse(fragments)
+
+      # Just after midnight the site may still be showing yesterday's puzzle. The cache only has it if
+      # the bot was running yesterday, so also compare with the last one stored, which survives a restart
+      yesterday = puzzle_cache.peek(source.name, _day_before(puzzle_date))
+      if yesterday is not None:
+        previous = _clue_texts(yesterday[1])
+      else:
+        previous = await db.store.get_previous_clue_texts(source.name, puzzle_date)
+      if previous == _clue_texts(puzzle[1]):
+        raise RuntimeError("today's puzzle hasn't been published yet, try again soon")
+      return puzzle
+
+    async def _get_puzzle(self, source: PuzzleSource, puzzle_date: str, session=None):
+      """Returns a copy of the source's puzzle for puzzle_date from the shared cache, fetching it if need be."""
+      return await puzzle_cache.get_or_fetch(
+        source.name, puzzle_date, lambda: self._load_puzzle(source, puzzle_date, session)
+      )
 
-    @staticmethod
-    def _prepare_image_files(puzzle_image: Image.Image, clues_image: Image.Image) -> list[discord.File]:
-      """Converts Pillow Image objects into a list of discord.File objects."""
-      files_to_send = []
+    @tasks.loop(minutes=5)
+    async def prefetch_puzzle(self):
+      """Fetches the new day's puzzles into the shared cache as soon as they have been published."""
+      puzzle_date = _today()
+      due = [source for source in SOURCES.values() if (source.name, puzzle_date) not in puzzle_cache]
+      if not due:
+        return
 
-      # Prepare the puzzle image
-      with io.BytesIO() as puzzle_binary:
-        puzzle_image.save(puzzle_binary, 'PNG')
-        puzzle_binary.seek(0)
-        files_to_send.append(discord.File(fp=puzzle_binary, filename="puzzle.png"))
+      # All at once over one HTTP session, and any that need a browser share the pool's
+      async with aiohttp.ClientSession(headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT) as session:
+        results = await asyncio.gather(
+          *(self._get_puzzle(source, puzzle_date, session) for source in due), return_exceptions=True
+        )
+      for source, result in zip(due, results):
+        if isinstance(result, Exception):
+          print(f"[WARNING] Prefetching {source.name} {puzzle_date} failed: {result}")
+
+    @prefetch_puzzle.before_loop
+    async def before_prefetch_puzzle(self):
+      await self.bot.wait_until_ready()
+
+    @tasks.loop(minutes=5)
+    async def post_subscriptions(self):
+      """
+      Posts the day's puzzles to every subscribed channel that doesn't have them yet, once it's POST_TIME.
+
+      Each puzzle is fetched, parsed and rendered once and the same images are uploaded to every
+      channel, though each thread gets its own copy of the puzzle to answer. Channels that fail are
+      tried again on the next run, so a restart or a late puzzle only delays the posts.
+      """
+      now = datetime.now()
+      if now.strftime('%H:%M') < POST_TIME:
+        return
+      puzzle_date = now.strftime('%Y-%m-%d')
+
+      skipped = self._fanout_skipped.get(puzzle_date, set())
+      self._fanout_skipped = {puzzle_date: skipped}
+      # Shared by every source, as the rate limits are per guild rather than per puzzle
+      semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+      sources = list(SOURCES.values())
+      with metrics.span("fanout"):
+        results = await asyncio.gather(
+          *(self._post_source(source, puzzle_date, skipped, semaphore) for source in sources), return_exceptions=True
+        )
+      # An error escaping the loop would stop it for good, and with it every later day's posts
+      for source, result in zip(sources, results):
+        if isinstance(result, Exception):
+          print(f"[WARNING] Posting {source.name} {puzzle_date} to subscribers failed: {result}")
 
-      # Prepare the clues image
-      with io.BytesIO() as clues_binary:
-        clues_image.save(clues_binary, 'PNG')
-        clues_binary.seek(0)
-        files_to_send.append(discord.File(fp=clues_binary, filename="clues.png"))
+    @post_subscriptions.before_loop
+    async def before_post_subscriptions(self):
+      await self.bot.wait_until_ready()
 
-      return files_to_send
+    async def _post_source(self, source: PuzzleSource, puzzle_date: str, skipped: set[int], semaphore: asyncio.Semaphore):
+      """Posts one source's puzzle to the channels subscribed to it."""
+      try:
+        channel_ids = await db.store.get_unposted_subscriptions(puzzle_date, source.name)
+      except Exception as e:
+        print(f"[WARNING] Looking up {source.name} subscriptions failed: {e}")
+        return
+      channel_ids = [channel_id for channel_id in channel_ids if channel_id not in skipped]
+      if not channel_ids:
+        return
 
-    @commands.slash_command(name="metrocryptic",
-                            description="Fetch the crossword and create a new thread in the channel")
-    async def metrocryptic(self, ctx: discord.ApplicationContext):
+      try:
+        grid, clue_dic = await self._get_puzzle(source, puzzle_date)
+      except Exception as e:
+        print(f"[WARNING] Fetching {source.name} {puzzle_date} for subscribers failed: {e}")
+        return
 
-      source = "metrocryptic"
-      puzzle_date = datetime.now().strftime('%Y-%m-%d')
+      images = await asyncio.gather(
+        self._encode_unanswered("grid", drawCrossword, grid_image_key, grid, GRID_IMAGE_FORMAT),
+        self._encode_unanswered("clues", drawClues, clues_image_key, clue_dic, CLUES_IMAGE_FORMAT),
+      )
+
+      async def post(channel_id: int):
+        async with semaphore:
+          await self._post_to_subscriber(source, channel_id, puzzle_date, images)
+
+      await asyncio.gather(*(post(channel_id) for channel_id in channel_ids))
+
+    async def _post_to_subscriber(self, source: PuzzleSource, channel_id: int, puzzle_date: str, images):
+      try:
+        # Answers change the grid and clues in place, so every thread needs its own copy from the cache
+        grid, clue_dic = await self._get_puzzle(source, puzzle_date)
+        try:
+          channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+          thread = await self._start_thread(channel, source, puzzle_date, grid, clue_dic)
+        except discord.NotFound:
+          # The channel is gone, so is its subscription. A NotFound from the upload below only means
+          # the new thread went missing, which is retried like any other failure
+          await db.store.remove_subscription(channel_id, source.name)
+          metrics.increment("fanout.unsubscribed")
+          return
+
+        try:
+          with metrics.span("upload"):
+            await self.send_queue.send(thread.id, lambda: thread.send(
+              content="Here are today's crossword and clues!", files=self._prepare_image_files(*images)
+            ))
+        except Exception:
+          # A thread without the puzzle in it is no use, and its row would stop the channel being tried again
+          await self._discard_thread(thread)
+          raise
+        metrics.increment("fanout.posted")
+      except discord.Forbidden:
+        print(f"[WARNING] Missing permissions to post the puzzle in channel {channel_id}")
+        self._fanout_skipped[puzzle_date].add(channel_id)
+        metrics.increment("fanout.failed")
+      except Exception as e:
+        print(f"[WARNING] Posting {source.name} in channel {channel_id} failed, will try again: {e}")
+        metrics.increment("fanout.failed")
+
+    @tasks.loop(seconds=2)
+    async def persist_puzzles(self):
+      """Writes answers back to the database and drops idle puzzles from memory."""
+      try:
+        with metrics.span("db.flush"):
+          await self.puzzle_states.flush()
+      except Exception as e:
+        print(f"[WARNING] Saving puzzle progress failed: {e}")
+      self.puzzle_states.evict()
+
+    @tasks.loop(seconds=METRICS_INTERVAL)
+    async def export_metrics(self):
+      """Writes the timings out for Prometheus to pick up."""
+      try:
+        metrics.write_prometheus(METRICS_FILE)
+      except OSError as e:
+        print(f"[WARNING] Writing metrics to {METRICS_FILE} failed: {e}")
+
+    def _drop_renderers(self, thread_id: int):
+      self.grid_renderers.pop(thread_id, None)
+      self.clue_renderers.pop(thread_id, None)
+
+    def _repaint_retained(self, thread_id: int, grid: Grid, clues: dict, changed_cells, changed_clues):
+      """
+      Repaints a thread's retained images with a change that isn't being rendered for a post yet.
+
+      Later renders only repaint their own changes, so a retained image left behind would be posted, and
+      cached, without this one.
+      """
+      grid_renderer = self.grid_renderers.get(thread_id)
+      if grid_renderer is not None:
+        grid_renderer.update(grid, changed_cells)
+      clue_renderer = self.clue_renderers.get(thread_id)
+      if clue_renderer is not None:
+        clue_renderer.update(clues, changed_clues)
+
+    async def _render_png(self, name: str, renderers: OrderedDict, renderer_type, draw, image_key, snapshot,
+                          image_format: str, thread_id: int, content, changed=None) -> bytes:
+      """
+      Returns the encoded grid or clue image for a thread, from the image cache when that exact image has been
+      encoded before.
+
+      A retained renderer is always brought up to date, since repainting a few cells or lines is cheap. Drawing from
+      scratch and encoding only happen on a cache miss.
+      """
+      renderer = renderers.get(thread_id)
+      if renderer is not None and changed is not None:
+        with metrics.span(f"render.{name}"):
+          renderer.update(content, changed)
+        renderers.move_to_end(thread_id)
+        key = image_key(content, image_format)
+        # Looking on disk awaits and another command may repaint the renderer meanwhile, so copy the image that
+        # matches key now
+        image = None if key in self.image_cache else renderer.image.copy()
+        png = await self.image_cache.get(key)
+        if png is None:
+          with metrics.span(f"encode.{name}"):
+            png = await self.render_executor.run(encodeImage, image, image_format)
+          self.image_cache.put(key, png)
+        return png
+
+      png = await self.image_cache.get(image_key(content, image_format))
+      if png is not None:
+        return png
+
+      # Drawn from a copy, as more answers can come in while the worker is busy. The key is worked out again
+      # as the content may have changed while the cache was looking on disk
+      key = image_key(content, image_format)
+      drawn = snapshot(content)
+      with metrics.span(f"render.{name}"):
+        image = await self.render_executor.run(draw, drawn)
+      if changed is not None and thread_id in renderers:
+        # Another command for this thread drew it while we waited, so bring that one up to date instead
+        renderers[thread_id].update(content, changed)
+      elif image_key(content, image_format) == key:
+        renderers[thread_id] = renderer_type(drawn, image=image.copy())
+        renderers.move_to_end(thread_id)
+        while len(renderers) > MAX_RETAINED_GRIDS:
+          renderers.popitem(last=False)
+      # Otherwise the puzzle changed while drawing. Kept, this image would miss those changes in every later
+      # repaint, so the next render draws it again instead
+
+      with metrics.span(f"encode.{name}"):
+        png = await self.render_executor.run(encodeImage, image, image_format)
+      self.image_cache.put(key, png)
+      return png
+
+    async def _encode_unanswered(self, name: str, draw, image_key, content, image_format: str) -> bytes:
+      """Returns the encoded image of a puzzle nobody has answered yet, drawing it only if it isn't cached."""
+      key = image_key(content, image_format)
+      png = await self.image_cache.get(key)
+      if png is None:
+        with metrics.span(f"render.{name}"):
+          image = await self.render_executor.run(draw, content)
+        with metrics.span(f"encode.{name}"):
+          png = await self.render_executor.run(encodeImage, image, image_format)
+        self.image_cache.put(key, png)
+      return png
+
+    async def _render_images(self, thread_id: int, grid: Grid, clues: dict, changed_cells=None, changed_clues=None):
+      """Renders the grid and clue images, then encodes them in the render executor. Returns both encoded images."""
+      return await asyncio.gather(
+        self._render_png(
+          "grid", self.grid_renderers, GridRenderer, drawCrossword, grid_image_key, Grid.copy, GRID_IMAGE_FORMAT,
+          thread_id, grid, changed_cells
+        ),
+        self._render_png(
+          "clues", self.clue_renderers, ClueRenderer, drawClues, clues_image_key, _copy_clues, CLUES_IMAGE_FORMAT,
+          thread_id, clues, changed_clues
+        ),
+      )
+
+    async def _publish_answers(self, thread_id: int, burst: AnswerBurst):
+      """Posts one update for a burst of answers collected by the answer batcher."""
+      puzzle_state = await self.puzzle_states.get(thread_id)
+      if not puzzle_state:
+        return
+
+      images = await self._render_images(
+        thread_id, puzzle_state["cells"], puzzle_state["clues"], burst.cells, {clue for _, clue, _ in burst.answers}
+      )
+      answers = "\n".join(f"{contributor} answered '{answer}' for clue '{clue}'" for contributor, clue, answer in burst.answers)
+      with metrics.span("upload"):
+        await self.send_queue.send(thread_id, lambda: burst.channel.send(
+          content=f"Thanks {', '.join(burst.contributors)}!\n{answers}",
+          files=self._prepare_image_files(*images)
+        ))
+
+      await self._check_completion(burst.channel, puzzle_state)
+
+    async def _check_completion(self, channel, puzzle_state: dict):
+      if puzzle_state["status"] == "running" and puzzle_state["cells"].is_complete():
+        await self.send_queue.send(
+          channel.id, lambda: channel.send("Congratulations! The crossword is complete!"), PRIORITY_INFO
+        )
+        await self.puzzle_states.set_status(puzzle_state["thread_id"], "completed")
+
+    @staticmethod
+    def _prepare_image_files(puzzle_png: bytes, clues_png: bytes) -> list[discord.File]:
+      """Wraps encoded images in a list of discord.File objects, named for their format."""
+      return [
+        discord.File(fp=io.BytesIO(puzzle_png), filename=f"puzzle.{imageExtension(GRID_IMAGE_FORMAT)}"),
+        discord.File(fp=io.BytesIO(clues_png), filename=f"clues.{imageExtension(CLUES_IMAGE_FORMAT)}"),
+      ]
+
+    async def _start_thread(self, channel, source: PuzzleSource, puzzle_date: str, grid: Grid, clue_dic: dict) -> discord.Thread:
+      """Creates a thread for the day's puzzle in channel and records it, returning the thread."""
+      thread = await channel.create_thread(
+        name=f"{source.title} {puzzle_date}",
+        type=discord.ChannelType.public_thread,
+      )
+
+      try:
+        with metrics.span("db.create"):
+          puzzle_state = await db.store.create_puzzle(
+            thread_id=thread.id,
+            channel_id=channel.id,
+            puzzle_date=puzzle_date,
+            source=source.name,
+            width=grid.width,
+            height=grid.height,
+            grid=grid,
+            clues_dict=clue_dic
+          )
+      except Exception:
+        await self._discard_thread(thread)
+        raise
+      self.puzzle_states.put(puzzle_state)
+      return thread
+
+    async def _discard_thread(self, thread: discord.Thread):
+      """Deletes a puzzle thread that couldn't be set up, along with anything recorded about it."""
+      try:
+        await thread.delete()
+      except discord.HTTPException as e:
+        print(f"[WARNING] Deleting the unfinished thread {thread.id} failed: {e}")
+      await db.store.delete_puzzle(thread.id)
+      self.puzzle_states.discard(thread.id)
+      self._drop_renderers(thread.id)
+
+    async def _start_daily_puzzle(self, ctx: discord.ApplicationContext, source: PuzzleSource):
+      """Starts a thread in the command's channel for the day's puzzle from source."""
+      puzzle_date = _today()
       channel_id = ctx.channel.id
 
-      existing_thread_id = db.check_puzzle_exists(channel_id, puzzle_date, source)
+      existing_thread_id = await db.store.check_puzzle_exists(channel_id, puzzle_date, source.name)
 
       if existing_thread_id:
         thread_url = f"https://discord.com/channels/{ctx.guild.id}/{existing_thread_id}"
         await ctx.respond(
-          f"Today's Metro Cryptic crossword is already running! You can find it here: {thread_url}",
+          f"Today's {source.title} crossword is already running! You can find it here: {thread_url}",
           ephemeral=True
         )
         return
 
       await ctx.defer()
 
-      metro_url = "https://metro.co.uk/puzzles/cryptic-crosswords-online-free-daily-word-puzzle/"
+      # Every channel shares the same parsed puzzle for the day
       try:
-        puzzle_html, across_html, down_html = await findMetroPuzzleHTML(metro_url)
+        grid, clue_dic = await self._get_puzzle(source, puzzle_date)
       except Exception as e:
         await ctx.followup.send(f"Error fetching puzzle: {e}", ephemeral=True)
         return
 
       try:
-        cell_dic, grid_width = findCellInfo(puzzle_html)
-        down_clues = getClues(down_html, "D")
-        across_clues = getClues(across_html, "A")
-        all_clues = down_clues + across_clues
-        clue_dic = cluesToDic(all_clues, cell_dic)
-      except Exception as e:
-        await ctx.followup.send(f"Error processing puzzle data: {e}", ephemeral=True)
-        return
-
-      puzzle_image_obj = drawCrossword(cell_dic, grid_width)
-      clues_image_obj = drawClues(clue_dic)
-
-      try:
-        thread = await ctx.channel.create_thread(
-          name=f"Metro Cryptic {puzzle_date}",
-          type=discord.ChannelType.public_thread,
-        )
+        thread = await self._start_thread(ctx.channel, source, puzzle_date, grid, clue_dic)
 
-        db.create_puzzle(
-          thread_id=thread.id,
-          channel_id=channel_id,
-          puzzle_date=puzzle_date,
-          source=source,
-          width=grid_width,
-          height=grid_width,
-          cells_dict=cell_dic,
-          clues_dict=clue_dic
-        )
-
-        files_to_send = self._prepare_image_files(puzzle_image_obj, clues_image_obj)
+        images = await self._render_images(thread.id, grid, clue_dic)
 
-        await thread.send(
-          content="Here are today's crossword and clues!",
-          files=files_to_send
-        )
+        with metrics.span("upload"):
+          await self.send_queue.send(thread.id, lambda: thread.send(
+            content="Here are today's crossword and clues!",
+            files=self._prepare_image_files(*images)
+          ))
 
         await ctx.followup.send(
           f"Thread '{thread.name}' created successfully!",
@@ -102,6 +482,44 @@ class CrosswordCog(commands.Cog):
       except Exception as error:
         await ctx.followup.send(f"Error creating thread or sending images: {error}", ephemeral=True)
 
+    @commands.slash_command(name="metrocryptic",
+                            description="Fetch the crossword and create a new thread in the channel")
+    async def metrocryptic(self, ctx: discord.ApplicationContext):
+      await self._start_daily_puzzle(ctx, METRO_CRYPTIC)
+
+    @commands.slash_command(name="metroquick",
+                            description="Fetch the Metro quick crossword and create a new thread in the channel")
+    async def metroquick(self, ctx: discord.ApplicationContext):
+      await self._start_daily_puzzle(ctx, METRO_QUICK)
+
+    @commands.slash_command(name="subscribe", description="Post a crossword in a new thread here every day")
+    @discord.default_permissions(manage_channels=True)
+    async def subscribe(
+      self, ctx: discord.ApplicationContext,
+      crossword: discord.Option(str, "Which crossword to post", choices=list(SOURCES), default=METRO_CRYPTIC.name)
+    ):
+      if isinstance(ctx.channel, discord.Thread) or ctx.guild is None:
+        await ctx.respond("Only server channels can be subscribed.", ephemeral=True)
+        return
+
+      source = get_source(crossword)
+      if await db.store.add_subscription(ctx.channel.id, ctx.guild.id, source.name):
+        await ctx.respond(f"Each day's {source.title} will be posted here from {POST_TIME}.")
+      else:
+        await ctx.respond(f"This channel is already subscribed to the {source.title}.", ephemeral=True)
+
+    @commands.slash_command(name="unsubscribe", description="Stop posting a crossword here every day")
+    @discord.default_permissions(manage_channels=True)
+    async def unsubscribe(
+      self, ctx: discord.ApplicationContext,
+      crossword: discord.Option(str, "Which crossword to stop", choices=list(SOURCES), default=METRO_CRYPTIC.name)
+    ):
+      source = get_source(crossword)
+      if await db.store.remove_subscription(ctx.channel.id, source.name):
+        await ctx.respond(f"The {source.title} won't be posted here automatically any more.")
+      else:
+        await ctx.respond(f"This channel isn't subscribed to the {source.title}.", ephemeral=True)
+
     @commands.slash_command(name="answer", description="Submit an answer")
     async def answer(self, ctx: discord.ApplicationContext, clue: str, answer: str):
       # Check if the clue exists crosswords table
@@ -109,14 +527,10 @@ class CrosswordCog(commands.Cog):
         await ctx.respond("This command can only be used inside a crossword thread.", ephemeral=True)
         return
 
-      await ctx.defer()
       thread_id = ctx.channel.id
-
-      # Fetch the current puzzle state from the database
-      puzzle_state = db.get_puzzle_state(thread_id)
-      if not puzzle_state:
-        await ctx.followup.send("This thread does not seem to contain an active crossword.", ephemeral=True)
-        return
+      batched = self.answer_batcher.is_enabled(thread_id)
+      # Batched answers are acknowledged privately and show up in the next combined update
+      await ctx.defer(ephemeral=batched)
 
       # Convert direction and answer to uppercase
       clue = clue.upper().replace(" ", "")
@@ -127,6 +541,18 @@ class CrosswordCog(commands.Cog):
         await ctx.respond("Invalid clue format! Use a number followed by 'A' or 'D', e.g., '5D'.", ephemeral=True)
         return
 
+      if not (answer.isascii() and answer.isalpha()):
+        await ctx.followup.send("Answers can only contain the letters A-Z.", ephemeral=True)
+        return
+
+      # Fetch the current puzzle state. Nothing below awaits until the change is applied, so no
+      # other command can change the puzzle in between
+      with metrics.span("state.get"):
+        puzzle_state = await self.puzzle_states.get(thread_id)
+      if not puzzle_state:
+        await ctx.followup.send("This thread does not seem to contain an active crossword.", ephemeral=True)
+        return
+
       # Verify if the clue exists in the puzzle
       if clue not in puzzle_state["clues"]:
         await ctx.followup.send(f"Clue {clue} not found in the puzzle.", ephemeral=True)
@@ -141,34 +567,54 @@ class CrosswordCog(commands.Cog):
         )
         return
 
-      # Set clue status to solved
-      puzzle_state["clues"][clue]["status"] = "solved"
+      # The cells were worked out when the puzzle was parsed
+      relevant_cells = puzzle_state["clues"][clue]["cells"]
+      letters = dict(zip(relevant_cells, answer))
 
-      # Get the starting cell and relevant cells
-      start_cell = puzzle_state["clues"][clue]["start"]
-      relevant_cells = getRelevantCells(start_cell, expected_length, clue[-1])
+      # Fill in the cells and set clue status to solved, queueing just those to be saved
+      self.puzzle_states.apply(thread_id, letters, {clue: "solved"})
 
-      for (x, y), letter in zip(relevant_cells, answer):
-        puzzle_state["cells"][(x, y)]["value"] = letter
-
-        # Save the updated state back to the database
-      db.update_puzzle_state(thread_id, puzzle_state["cells"], puzzle_state["clues"])
+      if batched:
+        # Not posted until the window closes, but anything posted before then has to show it
+        self._repaint_retained(thread_id, puzzle_state["cells"], puzzle_state["clues"], relevant_cells, [clue])
+        self.answer_batcher.add(thread_id, ctx.channel, ctx.author.mention, clue, answer, letters)
+        await ctx.followup.send(f"Got it! '{answer}' for clue '{clue}' will be in the next update.", ephemeral=True)
+        return
 
       # Generate and send the new images
-      puzzle_image_obj = drawCrossword(puzzle_state["cells"], puzzle_state["width"])
-      clues_image_obj = drawClues(puzzle_state["clues"])
-      files_to_send = self._prepare_image_files(puzzle_image_obj, clues_image_obj)
+      images = await self._render_images(thread_id, puzzle_state["cells"], puzzle_state["clues"], relevant_cells, [clue])
 
-      await ctx.followup.send(
-        content=f"{ctx.author.mention} answered '{answer}' for clue '{clue}'!",
-        files=files_to_send
-      )
+      with metrics.span("upload"):
+        await self.send_queue.send(thread_id, lambda: ctx.followup.send(
+          content=f"{ctx.author.mention} answered '{answer}' for clue '{clue}'!",
+          files=self._prepare_image_files(*images)
+        ), PRIORITY_FOLLOWUP)
 
       # Check for puzzle completion
-      all_filled = all(cell["value"] for cell in puzzle_state["cells"].values() if not cell["blank"])
-      if all_filled:
-        await ctx.channel.send("Congratulations! The crossword is complete!")
-        db.update_puzzle_status(thread_id, "completed")
+      await self._check_completion(ctx.channel, puzzle_state)
+
+    @commands.slash_command(
+      name="batchanswers",
+      description="Post answers in this thread as one update every few seconds (0 to turn off)"
+    )
+    @discord.default_permissions(manage_threads=True)
+    async def batchanswers(self, ctx: discord.ApplicationContext, seconds: float):
+      if not isinstance(ctx.channel, discord.Thread):
+        await ctx.respond("This command can only be used inside a crossword thread.", ephemeral=True)
+        return
+
+      thread_id = ctx.channel.id
+      if seconds <= 0:
+        self.answer_batcher.disable(thread_id)
+        await ctx.respond("Answers will be posted as soon as they come in.")
+        return
+
+      try:
+        self.answer_batcher.enable(thread_id, seconds)
+      except ValueError:
+        await ctx.respond(f"Pick a window between 0 and {MAX_WINDOW_SECONDS:g} seconds.", ephemeral=True)
+        return
+      await ctx.respond(f"Answers will be collected and posted together every {seconds:g} seconds.")
 
     @commands.slash_command(
       name="remove",
@@ -183,47 +629,87 @@ class CrosswordCog(commands.Cog):
       await ctx.defer()
       thread_id = ctx.channel.id
 
-      # Fetch the current puzzle state from the database
-      puzzle_state = db.get_puzzle_state(thread_id)
-      if not puzzle_state or puzzle_state.get("status") != "running":
-        await ctx.followup.send("This thread does not contain an active crossword.", ephemeral=True)
-        return
-
       # Convert direction
       clue = clue.upper().replace(" ", "")
       if len(clue) < 2 or not clue[:-1].isdigit() or clue[-1] not in ["A", "D"]:
         await ctx.followup.send("Invalid clue format! Use a number followed by 'A' or 'D'.", ephemeral=True)
         return
 
+      # Fetch the current puzzle state. Nothing below awaits until the change is applied, so no
+      # other command can change the puzzle in between
+      with metrics.span("state.get"):
+        puzzle_state = await self.puzzle_states.get(thread_id)
+      if not puzzle_state or puzzle_state.get("status") != "running":
+        await ctx.followup.send("This thread does not contain an active crossword.", ephemeral=True)
+        return
+
       if clue not in puzzle_state["clues"]:
         await ctx.followup.send(f"Clue {clue} not found in the puzzle.", ephemeral=True)
         return
 
-      # 3. Update the puzzle state in memory
-      clue_data = puzzle_state["clues"][clue]
-      clue_data["status"] = "unsolved"
+      relevant_cells = puzzle_state["clues"][clue]["cells"]
+      clues = puzzle_state["clues"]
 
-      expected_length = sum(clue_data["lengths"])
-      start_cell = clue_data["start"]
-      relevant_cells = getRelevantCells(start_cell, expected_length, clue[-1])
+      # Clearing the cells takes letters out of any clue crossing them, so those are unsolved too
+      statuses = {clue: "unsolved"}
+      for cell in relevant_cells:
+        for crossing in puzzle_state["cell_clues"].get(cell, ()):
+          if clues[crossing]["status"] == "solved":
+            statuses[crossing] = "unsolved"
 
-      # Clear the values from the cells for this clue
-      for x, y in relevant_cells:
-        if (x, y) in puzzle_state["cells"]:
-          puzzle_state["cells"][(x, y)]["value"] = ""
+      # Clear the values from the cells and mark the clues unsolved, queueing just those to be saved
+      letters = {cell: "" for cell in relevant_cells}
+      self.puzzle_states.apply(thread_id, letters, statuses)
 
-      # 4. Save the updated state back to the database
-      db.update_puzzle_state(thread_id, puzzle_state["cells"], puzzle_state["clues"])
+      # Generate and send the new images
+      images = await self._render_images(thread_id, puzzle_state["cells"], puzzle_state["clues"], relevant_cells, statuses)
+
+      with metrics.span("upload"):
+        await self.send_queue.send(thread_id, lambda: ctx.followup.send(
+          content=f"{ctx.author.mention} removed the answer for clue '{clue}'!",
+          files=self._prepare_image_files(*images)
+        ), PRIORITY_FOLLOWUP)
+
+    @commands.slash_command(name="profiling", description="Profile a sample of crossword commands to find slow spots")
+    @discord.default_permissions(administrator=True)
+    async def profiling(self, ctx: discord.ApplicationContext, enabled: bool, sample_rate: float = None):
+      if enabled and profiler.directory is None:
+        await ctx.respond("Set CROSSWORD_PROFILE_DIR to say where profiles should be written first.", ephemeral=True)
+        return
+      if sample_rate is not None and not 0 < sample_rate <= 1:
+        await ctx.respond("The sample rate has to be above 0 and at most 1.", ephemeral=True)
+        return
 
-      # 5. Generate and send the new images
-      puzzle_image_obj = drawCrossword(puzzle_state["cells"], puzzle_state["width"])
-      clues_image_obj = drawClues(puzzle_state["clues"])
-      files_to_send = self._prepare_image_files(puzzle_image_obj, clues_image_obj)
+      if sample_rate is not None:
+        profiler.sample_rate = sample_rate
+      elif enabled and profiler.sample_rate <= 0:
+        profiler.sample_rate = PROFILE_SAMPLE_RATE or 0.1
+      if not enabled:
+        profiler.sample_rate = 0
 
-      await ctx.followup.send(
-        content=f"{ctx.author.mention} removed the answer for clue '{clue}'!",
-        files=files_to_send
+      if profiler.enabled:
+        await ctx.respond(
+          f"Profiling {profiler.sample_rate:.0%} of commands into {profiler.directory}, keeping {profiler.keep} per command.",
+          ephemeral=True
+        )
+      else:
+        await ctx.respond("Profiling is off.", ephemeral=True)
+
+    @commands.slash_command(name="stats", description="Show how long each stage of the crossword commands takes")
+    @discord.default_permissions(administrator=True)
+    async def stats(self, ctx: discord.ApplicationContext):
+      cache = self.image_cache
+      summary = (
+        f"{metrics.format_table()}\n\n"
+        f"image cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} images, {cache.size / 1024:.0f} KB\n"
+        f"renders in flight: {self.render_executor.in_flight}\n"
+        f"messages queued: {self.send_queue.depth()} across {len(self.send_queue)} channels\n"
+        f"puzzles in memory: {len(self.puzzle_states)}"
       )
+      # Discord messages are capped at 2000 characters
+      if len(summary) > 1900:
+        summary = summary[:1900] + "\n..."
+      await ctx.respond(f"```\n{summary}\n```", ephemeral=True)
 
 def setup(bot):
     bot.add_cog(CrosswordCog(bot))
@@ -1,128 +1,348 @@
-from PIL import Image, ImageDraw, ImageFont
+from __future__ import annotations
 
+import io
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-def drawCrossword(cells, gridWidth):
-  font_path = "Roboto-VariableFont_wdth,wght.ttf"
-  cell_size = 40
-  width = gridWidth
-  height = gridWidth
+# Pillow is imported where it's used, so loading the cog doesn't wait on it
+if TYPE_CHECKING:
+  from PIL import Image
 
-  img_width = width * cell_size
-  img_height = height * cell_size
+
+FONT_PATH = "Roboto-VariableFont_wdth,wght.ttf"
+CELL_SIZE = 40
+# Big grids get smaller cells so the image is never wider or taller than this, down to MIN_CELL_SIZE
+MAX_GRID_IMAGE_SIZE = int(os.environ.get("CROSSWORD_MAX_GRID_PX", "1000"))
+MIN_CELL_SIZE = 16
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Labels pre-rendered up front, anything higher is rendered the first time it's needed
+MAX_PRERENDERED_LABEL = 40
+# Clue sheet layout
+CLUE_SHEET_WIDTH = 1300
+CLUE_MARGIN = 50
+CLUE_LINE_HEIGHT = 30
+# Clue lines kept rendered before the cache is started afresh, a few days of puzzles
+MAX_CLUE_LINES = 1000
+
+# Ways of encoding a finished image, see encodeImage
+IMAGE_FORMATS = ("png", "gray", "palette", "1bit", "webp")
+# The grid is only ever black, white and grays so it loses nothing as grayscale. The clue
+# sheet has red in it, and a small palette keeps that for a third of the size.
+GRID_IMAGE_FORMAT = os.environ.get("CROSSWORD_GRID_FORMAT", "gray")
+CLUES_IMAGE_FORMAT = os.environ.get("CROSSWORD_CLUES_FORMAT", "palette")
+PNG_COMPRESS_LEVEL = int(os.environ.get("CROSSWORD_PNG_COMPRESS_LEVEL", "6"))
+PALETTE_COLORS = 16
+# 0 is fastest, 6 smallest
+WEBP_METHOD = int(os.environ.get("CROSSWORD_WEBP_METHOD", "4"))
+
+
+class RenderContext:
+  """
+  Fonts and a glyph atlas shared between renders.
+
+  The atlas holds finished cell tiles: blank cells, every label on its own, A-Z on their own
+  and any label/letter combinations seen so far. Drawing a grid is then just pasting tiles.
+  Clue lines are kept the same way, as masks for the text and the strike-through.
+  """
+
+  def __init__(self, cell_size: int = CELL_SIZE, font_path: str = FONT_PATH):
+    from PIL import ImageFont
+
+    self.cell_size = cell_size
+    try:
+      self.small_font = ImageFont.truetype(font_path or "", int(cell_size * 0.3))
+      self.large_font = ImageFont.truetype(font_path or "", int(cell_size * 0.6))
+    except OSError:
+      self.small_font = None
+      self.large_font = None
+
+    try:
+      self.clue_font = ImageFont.truetype(font_path, size=20)
+    except OSError:
+      print("Failed to load custom font. Falling back to default font.")
+      self.clue_font = ImageFont.load_default()
+
+    self._tiles: dict[tuple, Image.Image] = {}
+    self._clue_lines: dict[tuple, tuple] = {}
+    self.tile(True, None, "")
+    self.tile(False, None, "")
+    for letter in LETTERS:
+      self.tile(False, None, letter)
+    for label in range(1, MAX_PRERENDERED_LABEL + 1):
+      self.tile(False, str(label), "")
+
+  def _draw_tile(self, blank: bool, label, value) -> Image.Image:
+    from PIL import Image, ImageDraw
+
+    cell_size = self.cell_size
+    tile = Image.new("RGB", (cell_size, cell_size), color="white")
+    draw = ImageDraw.Draw(tile)
+
+    if blank:
+      draw.rectangle([0, 0, cell_size, cell_size], fill="black", outline="black")
+      return tile
+
+    draw.rectangle([0, 0, cell_size, cell_size], fill="white", outline="black")
+
+    if label:
+      draw.text((2, 2), label, font=self.small_font, fill="black")
+
+    if value:
+      bbox = draw.textbbox((0, 0), value, font=self.large_font)
+      w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+      draw.text(((cell_size - w) / 2, (cell_size - h) / 2), value, font=self.large_font, fill="black")
+
+    return tile
+
+  def tile(self, blank: bool, label, value) -> Image.Image:
+    """Returns the tile for a cell, rendering and caching it if it hasn't been seen before."""
+    key = (True, None, "") if blank else (False, label or None, value or "")
+    tile = self._tiles.get(key)
+    if tile is None:
+      tile = self._draw_tile(*key)
+      self._tiles[key] = tile
+    return tile
+
+
+  def _draw_clue_line(self, text: str, solved: bool) -> tuple:
+    from PIL import Image, ImageDraw
+
+    font = self.clue_font
+    bbox = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    # Big enough for the text and the strike-through, which is 2px wide
+    size = (max(bbox[2], text_width) + 2, max(bbox[3], text_height // 2) + 2)
+
+    text_mask = Image.new("L", size)
+    ImageDraw.Draw(text_mask).text((0, 0), text, fill=255, font=font)
+    if not solved:
+      return text_mask, None
+
+    strike_mask = Image.new("L", size)
+    ImageDraw.Draw(strike_mask).line([(0, text_height // 2), (text_width, text_height // 2)], fill=255, width=2)
+    return text_mask, strike_mask
+
+  def clue_line(self, text: str, solved: bool) -> tuple:
+    """Returns (text mask, strike-through mask or None) for a line of the clue sheet."""
+    key = (text, solved)
+    line = self._clue_lines.get(key)
+    if line is None:
+      if len(self._clue_lines) >= MAX_CLUE_LINES:
+        self._clue_lines.clear()
+      line = self._clue_lines[key] = self._draw_clue_line(text, solved)
+    return line
+
+
+# Only MIN_CELL_SIZE to CELL_SIZE ever come up, so this stays small
+@lru_cache(maxsize=None)
+def getRenderContext(cell_size: int = CELL_SIZE) -> RenderContext:
+  """Returns the shared render context for a cell size, creating it on first use."""
+  return RenderContext(cell_size)
+
+
+def gridCellSize(grid) -> int:
+  """Cell size a grid is drawn at, CELL_SIZE unless that would take it past MAX_GRID_IMAGE_SIZE."""
+  longest_side = max(grid.width, grid.height, 1)
+  return max(MIN_CELL_SIZE, min(CELL_SIZE, MAX_GRID_IMAGE_SIZE // longest_side))
+
+
+def drawCrossword(grid, context: RenderContext = None):
+  from PIL import Image
+
+  context = context or getRenderContext(gridCellSize(grid))
+  cell_size = context.cell_size
+
+  img_width = grid.width * cell_size
+  img_height = grid.height * cell_size
 
   image = Image.new("RGB", (img_width, img_height), color="white")
-  draw = ImageDraw.Draw(image)
-
-  try:
-    small_font = ImageFont.truetype(font_path or "", int(cell_size * 0.3))
-    large_font = ImageFont.truetype(font_path or "", int(cell_size * 0.6))
-  except:
-    small_font = None
-    large_font = None
-
-  for (x, y), cell_data in cells.items():
-    x1 = x * cell_size
-    y1 = y * cell_size
-    x2 = x1 + cell_size
-    y2 = y1 + cell_size
-
-    if cell_data["blank"]:
-      draw.rectangle([x1, y1, x2, y2], fill="black", outline="black")
-    else:
-      draw.rectangle([x1, y1, x2, y2], fill="white", outline="black")
-
-      if cell_data["label"]:
-        label_text = cell_data["label"]
-        if small_font:
-          draw.text(
-            (x1 + 2, y1 + 2),
-            label_text,
-            font=small_font,
-            fill="black"
-          )
-        else:
-          draw.text((x1 + 2, y1 + 2), label_text, fill="black")
-
-      if cell_data["value"]:
-        letter_text = cell_data["value"]
-        if large_font:
-          bbox = draw.textbbox((0, 0), letter_text, font=large_font)
-          w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        else:
-          bbox = draw.textbbox((0, 0), letter_text, font=None)
-          w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-
-        text_x = x1 + (cell_size - w) / 2
-        text_y = y1 + (cell_size - h) / 2
-
-        if large_font:
-          draw.text((text_x, text_y), letter_text, font=large_font, fill="black")
-        else:
-          draw.text((text_x, text_y), letter_text, fill="black")
+
+  for x, y in grid.coords():
+    tile = context.tile(grid.is_blank(x, y), grid.label(x, y), grid.letter(x, y))
+    image.paste(tile, (x * cell_size, y * cell_size))
 
   return image
 
 
-def drawClues(cluesDic):
-  font_path = "Roboto-VariableFont_wdth,wght.ttf"
-  try:
-    font = ImageFont.truetype(font_path, size=20)
-  except OSError:
-    print("Failed to load custom font. Falling back to default font.")
-    font = ImageFont.load_default()
+class GridRenderer:
+  """
+  Keeps a rendered grid around so later changes only repaint the cells they touch.
 
-  across_clues = {k: v for k, v in cluesDic.items() if v["direction"] == "A"}
-  down_clues = {k: v for k, v in cluesDic.items() if v["direction"] == "D"}
+  The blanks, borders and labels are drawn once when the renderer is created. The image after
+  any sequence of updates is pixel-identical to a full drawCrossword render of the same grid.
+  """
 
-  max_clues = max(len(across_clues), len(down_clues))
-  line_height = 30
-  margin = 50
-  image_width = 1300
-  image_height = margin * 2 + max_clues * line_height
+  def __init__(self, grid, context: RenderContext = None, image: Image.Image = None):
+    self.context = context or getRenderContext(gridCellSize(grid))
+    # A full render of this grid may be passed in if it has already been done elsewhere
+    self.image = image if image is not None else drawCrossword(grid, self.context)
 
-  img = Image.new("RGB", (image_width, image_height), color="white")
+  def update(self, grid, changed_cells) -> Image.Image:
+    """
+    Repaints the given cells from their current state.
+
+    Args:
+        grid (Grid): The crossword grid.
+        changed_cells (iterable): (x, y) coordinates of the cells that changed.
+
+    Returns:
+        Image: The updated grid image.
+    """
+    cell_size = self.context.cell_size
+    for x, y in changed_cells:
+      if (x, y) not in grid:
+        continue
+      tile = self.context.tile(grid.is_blank(x, y), grid.label(x, y), grid.letter(x, y))
+      self.image.paste(tile, (x * cell_size, y * cell_size))
+    return self.image
+
+
+def _clueText(ref, clue_data) -> str:
+  return f"{clue_data.get('num', ref)}. {clue_data['text']}"
+
+
+def _clueLayout(cluesDic):
+  """Returns the clue sheet's size and the (x, y) of every clue's line."""
+  positions = {}
+  rows = {"A": 0, "D": 0}
+  for ref, clue_data in cluesDic.items():
+    direction = clue_data["direction"]
+    if direction not in rows:
+      continue
+    x_offset = CLUE_MARGIN if direction == "A" else CLUE_SHEET_WIDTH // 2
+    positions[ref] = (x_offset, CLUE_MARGIN + CLUE_LINE_HEIGHT * (rows[direction] + 1))
+    rows[direction] += 1
+
+  return (CLUE_SHEET_WIDTH, CLUE_MARGIN * 2 + max(rows.values()) * CLUE_LINE_HEIGHT), positions
+
+
+def _pasteClueLine(image, line, position):
+  text_mask, strike_mask = line
+  image.paste("gray" if strike_mask else "black", position, text_mask)
+  if strike_mask:
+    image.paste("red", position, strike_mask)
+
+
+def drawClues(cluesDic, context: RenderContext = None):
+  from PIL import Image, ImageDraw
+
+  context = context or getRenderContext()
+  font = context.clue_font
+  size, positions = _clueLayout(cluesDic)
+
+  img = Image.new("RGB", size, color="white")
   draw = ImageDraw.Draw(img)
 
-  title_y = margin
-  draw.text((margin, title_y), "Across", fill="black", font=font)
-  draw.text((image_width // 2, title_y), "Down", fill="black", font=font)
-
-  y_offset = margin + line_height
-  for index, clue_type in enumerate([across_clues, down_clues]):
-    x_offset = margin if index == 0 else image_width // 2
-    current_y = y_offset
-    for ref, clue_data in clue_type.items():
-      clue_num = clue_data.get("num", ref)
-      clue_text = f"{clue_num}. {clue_data['text']}"
-
-      if clue_data["status"] == "solved":
-        draw.text((x_offset, current_y), clue_text, fill="gray", font=font)
-        bbox = draw.textbbox((0, 0), clue_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        draw.line(
-          [(x_offset, current_y + text_height // 2),
-           (x_offset + text_width, current_y + text_height // 2)],
-          fill="red",
-          width=2
-        )
-      else:
-        draw.text((x_offset, current_y), clue_text, fill="black", font=font)
-
-      current_y += line_height
+  title_y = CLUE_MARGIN
+  draw.text((CLUE_MARGIN, title_y), "Across", fill="black", font=font)
+  draw.text((CLUE_SHEET_WIDTH // 2, title_y), "Down", fill="black", font=font)
+
+  # Each line is pasted from the context's masks rather than drawn and measured again
+  for ref, position in positions.items():
+    clue_data = cluesDic[ref]
+    _pasteClueLine(img, context.clue_line(_clueText(ref, clue_data), clue_data["status"] == "solved"), position)
 
   return img
 
 
-def getRelevantCells(start, length, direction):
-  x_start, y_start = start
-  relevant_cells = []
+class ClueRenderer:
+  """
+  Keeps a rendered clue sheet around so a change of status only repaints that clue's line.
+
+  Lines are repainted by clearing their slot, so that's only done when every line, solved or
+  not, fits inside its own slot. Otherwise, and whenever the clues themselves change, the
+  whole sheet is drawn again. Either way the image matches a full drawClues render.
+  """
+
+  def __init__(self, cluesDic, context: RenderContext = None, image: Image.Image = None):
+    self.context = context or getRenderContext()
+    self._reset(cluesDic, image)
+
+  def _reset(self, cluesDic, image: Image.Image = None):
+    # A full render of these clues may be passed in if it has already been done elsewhere
+    self.image = image if image is not None else drawClues(cluesDic, self.context)
+    self._texts = {ref: _clueText(ref, clue_data) for ref, clue_data in cluesDic.items()}
+    _, self._positions = _clueLayout(cluesDic)
+    self._in_place = all(
+      self._fits(ref, self.context.clue_line(self._texts[ref], solved))
+      for ref in self._positions for solved in (False, True)
+    )
+
+  def _slot_width(self, ref) -> int:
+    x_offset = self._positions[ref][0]
+    return (CLUE_SHEET_WIDTH // 2 if x_offset == CLUE_MARGIN else CLUE_SHEET_WIDTH) - x_offset
+
+  def _fits(self, ref, line) -> bool:
+    width, height = line[0].size
+    return width <= self._slot_width(ref) and height <= CLUE_LINE_HEIGHT
+
+  def update(self, cluesDic, changed_clues) -> Image.Image:
+    """
+    Repaints the lines of the given clues from their current status.
+
+    Args:
+        cluesDic (dict): The clues dictionary.
+        changed_clues (iterable): References of the clues that changed.
+
+    Returns:
+        Image: The updated clue sheet.
+    """
+    texts = {ref: _clueText(ref, clue_data) for ref, clue_data in cluesDic.items()}
+    if not self._in_place or texts != self._texts:
+      self._reset(cluesDic)
+      return self.image
+
+    for ref in changed_clues:
+      if ref not in self._positions:
+        continue
+      x, y = self._positions[ref]
+      self.image.paste("white", (x, y, x + self._slot_width(ref), y + CLUE_LINE_HEIGHT))
+      _pasteClueLine(self.image, self.context.clue_line(texts[ref], cluesDic[ref]["status"] == "solved"), (x, y))
+    return self.image
+
+
+def encodePNG(image: Image.Image) -> bytes:
+  """Encodes a Pillow image as PNG bytes."""
+  with io.BytesIO() as binary:
+    image.save(binary, 'PNG')
+    return binary.getvalue()
+
+
+def encodeImage(image: Image.Image, image_format: str = "png") -> bytes:
+  """
+  Encodes a Pillow image for upload.
+
+  Args:
+      image (Image): The image to encode.
+      image_format (str): One of IMAGE_FORMATS. "png" keeps every color, "gray" and
+        "palette" are smaller PNGs, "1bit" is black and white only and "webp" is lossless WebP.
+
+  Returns:
+      bytes: The encoded image.
+  """
+  from PIL import Image
+
+  if image_format == "png":
+    pass
+  elif image_format == "gray":
+    image = image.convert("L")
+  elif image_format == "palette":
+    image = image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+  elif image_format == "1bit":
+    image = image.convert("1", dither=Image.Dither.NONE)
+  elif image_format == "webp":
+    with io.BytesIO() as binary:
+      image.save(binary, "WEBP", lossless=True, method=WEBP_METHOD)
+      return binary.getvalue()
+  else:
+    raise ValueError(f"Unknown image format {image_format!r}, expected one of {IMAGE_FORMATS}")
+
+  with io.BytesIO() as binary:
+    image.save(binary, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return binary.getvalue()
+
 
-  for i in range(length):
-    if direction.upper() == "A":
-      relevant_cells.append((x_start + i, y_start))
-    elif direction.upper() == "D":
-      relevant_cells.append((x_start, y_start + i))
-    else:
-      raise ValueError("Invalid direction. Use 'A' for across or 'D' for down.")
-  return relevant_cells
+def imageExtension(image_format: str) -> str:
+  return "webp" if image_format == "webp" else "png"
@@ -1,34 +1,136 @@
-from bs4 import BeautifulSoup
+import asyncio
+import os
+
+import aiohttp
 import re
-from playwright.async_api import async_playwright
 
-async def findMetroPuzzleHTML(url):
+from cogs.crossword.grid import Grid
+from cogs.crossword.metrics import metrics
+
+HTTP_HEADERS = {
+  "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+  "Accept": "text/html,application/xhtml+xml",
+}
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+# "lxml" parses the grid and both clue lists in one go, "html.parser" uses BeautifulSoup per fragment
+PARSERS = ("lxml", "html.parser")
+PARSER = os.environ.get("CROSSWORD_PARSER", "lxml")
+
+DASHED_LENGTH = re.compile(r"\((\d+)-(\d+)\)")
+TRAILING_UNDEFINED = re.compile(r"(\([\d,]+\)) undefined$")
+CLUE_LENGTH = re.compile(r'\(([\d,]+)\)$')
+
+
+async def _extractPuzzleFragments(page, url):
+    """Navigates the page to the url and pulls out the grid and both clue lists."""
+    await page.goto(url, timeout=60000)
+
+    # Wait for the puzzle grid to be visible to ensure the page has loaded
+    await page.locator("#puzzle-grid").wait_for(timeout=30000)
+
+    # Find elements directly on the page
+    puzzle_html = await page.locator("#puzzle-grid").inner_html()
+    across_html = await page.locator(".clue-list.clue-list-across").inner_html()
+    down_html = await page.locator(".clue-list.clue-list-down").inner_html()
+
+    return puzzle_html, across_html, down_html
+
+
+async def findMetroPuzzleHTML(url, pool=None):
     """
     Finds puzzle data using Playwright.
 
     Args:
       url (str): url of site to get crossword
+      pool (BrowserPool, optional): warm browser pool to take a page from. Without one
+        a browser is launched and closed just for this call.
 
   Returns:
       list: Three HTML extracts of the puzzle and each set of clues
     """
+    if pool is not None:
+        async with pool.page() as page:
+            return await _extractPuzzleFragments(page, url)
+
+    # Only needed when the HTTP fetch fails, so it isn't imported until then
+    from playwright.async_api import async_playwright
+
     async with async_playwright() as p:
         browser = await p.chromium.launch()
         page = await browser.new_page()
         try:
-            await page.goto(url, timeout=60000)
+            return await _extractPuzzleFragments(page, url)
+        finally:
+            await browser.close()
 
-            # Wait for the puzzle grid to be visible to ensure the page has loaded
-            await page.locator("#puzzle-grid").wait_for(timeout=30000)
 
-            # Find elements directly on the page
-            puzzle_html = await page.locator("#puzzle-grid").inner_html()
-            across_html = await page.locator(".clue-list.clue-list-across").inner_html()
-            down_html = await page.locator(".clue-list.clue-list-down").inner_html()
+def extractPuzzleFragments(page_html):
+    """
+    Pulls the puzzle grid and both clue lists out of a full page of HTML.
 
-            return puzzle_html, across_html, down_html
-        finally:
-            await browser.close()
+    Args:
+      page_html (str): HTML of the whole puzzle page
+
+    Returns:
+      tuple: The same three HTML extracts findMetroPuzzleHTML returns
+
+    Raises:
+      ValueError: If the page doesn't contain a rendered puzzle
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_html, "html.parser")
+    grid = soup.select_one("#puzzle-grid")
+    across = soup.select_one(".clue-list.clue-list-across")
+    down = soup.select_one(".clue-list.clue-list-down")
+
+    # The grid is filled in client side on some pages, so an empty one is no use either
+    if grid is None or across is None or down is None or grid.find("td") is None:
+        raise ValueError("Puzzle not found in page HTML")
+
+    return grid.decode_contents(), across.decode_contents(), down.decode_contents()
+
+
+async def fetchMetroPuzzleHTTP(url, session=None):
+    """
+    Finds puzzle data with a plain HTTP request, without starting a browser.
+
+    Args:
+      url (str): url of site to get crossword
+      session (aiohttp.ClientSession, optional): session to reuse for the request
+
+    Returns:
+      tuple: Three HTML extracts of the puzzle and each set of clues
+    """
+    if session is None:
+        async with aiohttp.ClientSession(headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT) as session:
+            return await fetchMetroPuzzleHTTP(url, session)
+
+    async with session.get(url, headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        page_html = await response.text()
+    return extractPuzzleFragments(page_html)
+
+
+async def fetchPuzzleFragments(url, pool=None, session=None):
+    """
+    Finds puzzle data over plain HTTP, falling back to Playwright if that doesn't work.
+
+    Args:
+      url (str): url of site to get crossword
+      pool (BrowserPool, optional): browser pool used by the Playwright fallback
+      session (aiohttp.ClientSession, optional): session used by the HTTP fast path
+
+    Returns:
+      tuple: Three HTML extracts of the puzzle and each set of clues
+    """
+    try:
+        return await fetchMetroPuzzleHTTP(url, session)
+    # aiohttp's timeout is asyncio.TimeoutError, which only became the builtin TimeoutError in Python 3.11
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        print(f"[INFO] HTTP fetch of {url} failed ({e!r}), falling back to Playwright.")
+    return await findMetroPuzzleHTML(url, pool=pool)
 
 
 def getClues(clues_html, direction):
@@ -46,6 +148,8 @@ def getClues(clues_html, direction):
     print("No HTML provided.")
     return []
 
+  from bs4 import BeautifulSoup
+
   soup = BeautifulSoup(clues_html, "html.parser")
   clues = []
 
@@ -54,46 +158,35 @@ def getClues(clues_html, direction):
     value = li.get("value")
     direc = direction
 
-    # Fix lengths written as (1-4) instead of (1,4)
-    text = re.sub(r"\((\d+)-(\d+)\)", r"(\1,\2)", text)  # Convert (1-4) → (1,4)
-
-    # Only remove " undefined" if it appears **after the length at the end**
-    text = re.sub(r"(\([\d,]+\)) undefined$", r"\1", text)  # Removes " undefined" only if after length
-
-    clues.append((value, text, direc))
+    clues.append((value, cleanClueText(text), direc))
 
   return clues
 
 
-def findClueStart(cell_array, label):
-  """
-  Find the starting (x, y) position of a clue based on its label.
+def cleanClueText(text):
+  """Tidies the length at the end of a clue's text."""
+  # Fix lengths written as (1-4) instead of (1,4)
+  text = DASHED_LENGTH.sub(r"(\1,\2)", text)  # Convert (1-4) → (1,4)
 
-  Args:
-      cell_array (dict): Dictionary of cells, keyed by (x, y), with cell data as values.
-      label (str): The label of the clue to find.
+  # Only remove " undefined" if it appears **after the length at the end**
+  return TRAILING_UNDEFINED.sub(r"\1", text)  # Removes " undefined" only if after length
 
-  Returns:
-      tuple: (x, y) coordinates of the cell with the matching label, or None if not found.
-  """
-  for (x, y), cell_data in cell_array.items():
-    if cell_data.get("label") == str(label):  # Check if the cell's label matches the clue number
-      return x, y
-  return None  # Return None if no matching cell is found
 
-
-def cluesToDic(clues, cell_array):
+def cluesToDic(clues, grid):
   """
   Converts a list of clues into a structured dictionary.
 
   Args:
       clues (list): List of clue tuples (number, text, direction).
-      cell_array (dict): Dictionary of crossword cells.
+      grid (Grid): The crossword grid.
 
   Returns:
       dict: A dictionary mapping clue references (e.g., "5A") to their metadata.
   """
   clues_dic = {}
+  skipped = []
+  # Looked up once, rather than scanning the grid for every clue
+  label_positions = grid.label_positions()
 
   for clue in clues:
     direc = clue[2]  # Direction ("A" or "D")
@@ -101,22 +194,19 @@ def cluesToDic(clues, cell_array):
     text = clue[1]  # Clue text
     ref = value + direc  # Reference, e.g., "5A" or "4D"
 
-    # Debugging: Check the clue format
-    print(f"[DEBUG] Processing clue: {clue}")
-
     # Find the starting position of the clue
-    start = findClueStart(cell_array, value)
+    start = label_positions.get(value)
     if not start:
-      print(f"[WARNING] Start not found for clue {ref}. Skipping.")
+      skipped.append(f"{ref} (no start)")
       continue
 
     # Extract the clue length(s) from the clue text
-    clue_length_match = re.search(r'\(([\d,]+)\)$', text)
+    clue_length_match = CLUE_LENGTH.search(text)
     if clue_length_match:
       # Convert the length(s) to a list of integers
       clue_lengths = [int(x) for x in clue_length_match.group(1).split(",")]
     else:
-      print(f"[WARNING] Length not found for clue {ref}. Skipping.")
+      skipped.append(f"{ref} (no length)")
       continue  # Skip this clue if the length is not found
 
     # Store the clue in the dictionary
@@ -127,39 +217,121 @@ def cluesToDic(clues, cell_array):
       "direction": direc,  # Clue direction
       "text": text,  # Clue text
       "num": value,  # Clue number
+      "cells": grid.slot(start, sum(clue_lengths), direc),  # Every (x, y) the answer fills
     }
 
+  # Reported once per puzzle rather than per clue
+  if skipped:
+    metrics.increment("clues_skipped", len(skipped))
+    print(f"[WARNING] Skipped clues: {', '.join(skipped)}")
+
   return clues_dic
 
 
 def findCellInfo(puzzle_html):
+  """
+  Reads the grid layout out of the puzzle HTML.
+
+  Args:
+      puzzle_html (str): HTML of the puzzle grid.
+
+  Returns:
+      Grid: The grid, with its blanks and labels set.
+  """
   if not puzzle_html:
     print("No HTML provided.")
-    return {}, 0  # Return an empty dictionary and 0 rows if no HTML is provided
+    return Grid(0, 0)  # Return an empty grid if no HTML is provided
+
+  from bs4 import BeautifulSoup
 
   soup = BeautifulSoup(puzzle_html, "html.parser")
-  cells = {}
-  rows = 0
+  rows = []
+  for tr in soup.find_all("tr"):
+    row = []
+    for td in tr.find_all("td"):
+      label = td.find("span", class_="cell-label")
+      row.append((label.get_text(strip=True) if label else None, "inactive" in td.get("class", "")))
+    rows.append(row)
+
+  return gridFromRows(rows)
+
+
+def gridFromRows(rows):
+  """Builds a Grid as wide as the longest row from rows of (label text, is blank) for each cell."""
+  width = max((len(row) for row in rows), default=0)
+  grid = Grid(width, len(rows))
 
   # Iterate through rows with enumerate to get the row index
-  for row_index, tr in enumerate(soup.find_all("tr")):
-    rows += 1
-    for column_index, td in enumerate(tr.find_all("td")):
-      label = td.find("span", class_="cell-label")
-      label_text = label.get_text(strip=True) if label else None
-      x = column_index
-      y = row_index
-      value = ""
-      clues = set()  # Use a set to track clues that involve this cell
-      blank = "inactive" in td.get("class", "")
-
-      # Use (x, y) as the key and store the cell details in a dictionary
-      cells[(x, y)] = {
-        "blank": blank,  # Whether the cell is a blank cell
-        "label": label_text,  # The cell's label
-        "value": value,  # The cell's value (updated later with answers)
-        "clues": clues  # Clues associated with this cell
-      }
-
-  return cells, rows
+  for y, row in enumerate(rows):
+    for x, (label_text, blank) in enumerate(row):
+      grid.set_blank(x, y, blank)
+      grid.set_label(x, y, label_text)
+    # A short row has nothing to fill past its end
+    for x in range(len(row), width):
+      grid.set_blank(x, y, True)
+
+  return grid
 
+
+def _strippedText(element):
+  # Same as BeautifulSoup's get_text(strip=True)
+  return "".join(text.strip() for text in element.itertext())
+
+
+def parseFragmentsLxml(puzzle_html, across_html, down_html):
+  """
+  Reads the grid and both clue lists with lxml, parsing the three fragments as one document.
+
+  Returns:
+      tuple: (Grid, across clues, down clues), matching findCellInfo and getClues
+  """
+  if not (puzzle_html and across_html and down_html):
+    print("No HTML provided.")
+
+  import lxml.html
+
+  root = lxml.html.fragment_fromstring(
+    f"<div>{puzzle_html or ''}</div><div>{across_html or ''}</div><div>{down_html or ''}</div>",
+    create_parent="div",
+  )
+  grid_part, across_part, down_part = root
+
+  rows = []
+  for tr in grid_part.iter("tr"):
+    row = []
+    for td in tr.iter("td"):
+      label = next((span for span in td.iter("span") if "cell-label" in span.get("class", "").split()), None)
+      row.append((_strippedText(label) if label is not None else None, "inactive" in td.get("class", "").split()))
+    rows.append(row)
+
+  clues = {}
+  for direction, part in (("A", across_part), ("D", down_part)):
+    clues[direction] = []
+    for li in part.iter("li"):
+      span = next(li.iter("span"))
+      clues[direction].append((li.get("value"), cleanClueText(_strippedText(span)), direction))
+
+  return gridFromRows(rows), clues["A"], clues["D"]
+
+
+def parsePuzzle(puzzle_html, across_html, down_html, parser=None):
+  """
+  Parses the three HTML extracts returned by findMetroPuzzleHTML.
+
+  Args:
+      parser (str, optional): One of PARSERS, defaults to PARSER.
+
+  Returns:
+      tuple: (Grid, clues dictionary)
+  """
+  parser = parser or PARSER
+  if parser == "lxml":
+    grid, across_clues, down_clues = parseFragmentsLxml(puzzle_html, across_html, down_html)
+  elif parser == "html.parser":
+    grid = findCellInfo(puzzle_html)
+    down_clues = getClues(down_html, "D")
+    across_clues = getClues(across_html, "A")
+  else:
+    raise ValueError(f"Unknown parser {parser!r}, expected one of {PARSERS}")
+  clue_dic = cluesToDic(down_clues + across_clues, grid)
+  return grid, clue_dic
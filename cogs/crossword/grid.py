@@ -0,0 +1,183 @@
+from array import array
+
+EMPTY = ord(".")
+BLANK = ord("#")
+
+
+class Grid:
+  """
+  A crossword grid stored in flat arrays indexed by y * width + x.
+
+  letters holds one ASCII byte per cell: a letter, EMPTY for an open cell with no letter yet
+  or BLANK for a blank cell, so it doubles as the packed fill string stored in the database.
+  blank is a 0/1 mask and labels holds each cell's clue number, or 0 if it has none.
+  """
+  __slots__ = ("width", "height", "letters", "blank", "labels")
+
+  def __init__(self, width: int, height: int):
+    self.width = width
+    self.height = height
+    self.letters = bytearray([EMPTY]) * (width * height)
+    self.blank = bytearray(width * height)
+    self.labels = array("H", bytes(2 * width * height))
+
+  def __len__(self) -> int:
+    return self.width * self.height
+
+  def __eq__(self, other) -> bool:
+    return (
+      isinstance(other, Grid)
+      and (self.width, self.height) == (other.width, other.height)
+      and self.letters == other.letters
+      and self.blank == other.blank
+      and self.labels == other.labels
+    )
+
+  def __contains__(self, coords) -> bool:
+    x, y = coords
+    return 0 <= x < self.width and 0 <= y < self.height
+
+  def index(self, x: int, y: int) -> int:
+    return y * self.width + x
+
+  def coords(self):
+    """Yields every (x, y) in row order."""
+    for y in range(self.height):
+      for x in range(self.width):
+        yield x, y
+
+  def is_blank(self, x: int, y: int) -> bool:
+    return self.blank[y * self.width + x] == 1
+
+  def label(self, x: int, y: int):
+    """Returns the cell's clue number as a string, or None."""
+    number = self.labels[y * self.width + x]
+    return str(number) if number else None
+
+  def letter(self, x: int, y: int) -> str:
+    """Returns the letter in the cell, or "" if it is empty or blank."""
+    value = self.letters[y * self.width + x]
+    return "" if value in (EMPTY, BLANK) else chr(value)
+
+  def set_blank(self, x: int, y: int, blank: bool = True):
+    i = y * self.width + x
+    self.blank[i] = 1 if blank else 0
+    self.letters[i] = BLANK if blank else EMPTY
+
+  def set_label(self, x: int, y: int, label):
+    self.labels[y * self.width + x] = int(label) if label else 0
+
+  def set_letter(self, x: int, y: int, letter: str):
+    """Puts a letter in an open cell. An empty string clears it."""
+    i = y * self.width + x
+    if self.blank[i]:
+      return
+    if not letter:
+      self.letters[i] = EMPTY
+      return
+    if len(letter) != 1 or not (letter.isascii() and letter.isalpha()):
+      raise ValueError(f"Cells can only hold a single letter A-Z, got {letter!r}")
+    self.letters[i] = ord(letter.upper())
+
+  def find_label(self, label):
+    """Returns the (x, y) of the cell with this clue number, or None."""
+    try:
+      i = self.labels.index(int(label))
+    except ValueError:
+      return None
+    return i % self.width, i // self.width
+
+  def label_positions(self) -> dict:
+    """Maps every clue number, as a string, to the (x, y) of its cell in one pass over the grid."""
+    width = self.width
+    return {str(number): (i % width, i // width) for i, number in enumerate(self.labels) if number}
+
+  def slot(self, start, length: int, direction: str) -> list:
+    """The (x, y) of each cell of an answer, cut off at the edge of the grid."""
+    x, y = start
+    dx, dy = (1, 0) if direction == "A" else (0, 1)
+    cells = [(x + dx * i, y + dy * i) for i in range(length)]
+    return [cell for cell in cells if cell in self]
+
+  def merge_letters(self, other: "Grid", keep=()):
+    """Copies the letters from another copy of this grid, except at the cell indexes in keep."""
+    keep = set(keep)
+    for i, value in enumerate(other.letters):
+      if i not in keep:
+        self.letters[i] = value
+
+  def is_complete(self) -> bool:
+    """True once every open cell has a letter."""
+    return EMPTY not in self.letters
+
+  @property
+  def fill(self) -> str:
+    """The letters as a string, one character per cell in row order."""
+    return self.letters.decode("ascii")
+
+  def load_fill(self, fill: str):
+    """Restores letters saved with the fill property."""
+    letters = bytearray(fill, "ascii")
+    if len(letters) != len(self):
+      raise ValueError(f"Fill has {len(letters)} cells, grid has {len(self)}")
+    # Blank cells always come from the layout
+    for i, is_blank in enumerate(self.blank):
+      if is_blank:
+        letters[i] = BLANK
+    self.letters = letters
+
+  def layout(self) -> dict:
+    """The parts of the grid that never change, in a JSON friendly form."""
+    return {
+      "width": self.width,
+      "height": self.height,
+      "blank": "".join(map(str, self.blank)),
+      "labels": self.labels.tolist(),
+    }
+
+  @classmethod
+  def from_layout(cls, layout: dict, fill: str = None) -> "Grid":
+    grid = cls(layout["width"], layout["height"])
+    for i, flag in enumerate(layout["blank"]):
+      if flag == "1":
+        grid.blank[i] = 1
+        grid.letters[i] = BLANK
+    grid.labels = array("H", layout["labels"])
+    if fill is not None:
+      grid.load_fill(fill)
+    return grid
+
+  @classmethod
+  def from_cells(cls, cells: dict, width: int, height: int) -> "Grid":
+    """Builds a grid from the older dictionary of cells keyed by (x, y)."""
+    grid = cls(width, height)
+    for (x, y), cell_data in cells.items():
+      grid.set_blank(x, y, cell_data["blank"])
+      grid.set_label(x, y, cell_data.get("label"))
+      if not cell_data["blank"] and cell_data.get("value"):
+        grid.set_letter(x, y, cell_data["value"])
+    return grid
+
+  def copy(self) -> "Grid":
+    grid = Grid.__new__(Grid)
+    grid.width = self.width
+    grid.height = self.height
+    grid.letters = bytearray(self.letters)
+    grid.blank = bytearray(self.blank)
+    grid.labels = array("H", self.labels)
+    return grid
+
+  def __copy__(self):
+    return self.copy()
+
+  def __deepcopy__(self, memo):
+    return self.copy()
+
+
+def index_clues(clues: dict) -> dict:
+  """Maps each (x, y) to the references of the clues running through it, from each clue's cells."""
+  cell_clues = {}
+  for ref, clue in clues.items():
+    for x, y in clue["cells"]:
+      cell_clues.setdefault((x, y), []).append(ref)
+  return cell_clues
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cogs.crossword.draw_crossword import gridCellSize
+
+# Encoded images kept in memory
+MAX_CACHE_BYTES = int(float(os.environ.get("CROSSWORD_IMAGE_CACHE_MB", "32")) * 1024 * 1024)
+# Images pushed out of memory are written here if it is set, and read back on a miss
+SPILL_DIR = os.environ.get("CROSSWORD_IMAGE_CACHE_DIR") or None
+MAX_SPILL_BYTES = int(float(os.environ.get("CROSSWORD_IMAGE_CACHE_DISK_MB", "256")) * 1024 * 1024)
+
+
+def grid_image_key(grid, image_format: str = "png", cell_size: int = None) -> str:
+  """Hash of everything that goes into drawing and encoding a grid."""
+  cell_size = cell_size or gridCellSize(grid)
+  digest = hashlib.sha256(f"grid:{image_format}:{grid.width}x{grid.height}@{cell_size}:".encode())
+  digest.update(grid.letters)
+  digest.update(grid.labels.tobytes())
+  return digest.hexdigest()
+
+
+def clues_image_key(clues: dict, image_format: str = "png") -> str:
+  """Hash of everything that goes into drawing and encoding a clue sheet."""
+  digest = hashlib.sha256(f"clues:{image_format}:".encode())
+  for ref, clue in clues.items():
+    digest.update(repr((ref, clue.get("num"), clue["text"], clue["direction"], clue["status"])).encode())
+  return digest.hexdigest()
+
+
+class ImageCache:
+  """
+  LRU of encoded images keyed by a hash of what was drawn, bounded by their total size.
+
+  Identical images come up a lot: every channel starts the day on the same empty grid and
+  clue sheet, and removing then re-entering an answer goes back to an earlier image. With
+  spill_dir set, images dropped from memory are kept on disk until that passes max_spill_bytes.
+
+  Disk reads and writes happen on a single worker thread, in the order they were asked for, so
+  they never block the event loop. The spilled images are listed once when the cache starts and
+  tracked from then on, so a miss only opens a file that is known to be there.
+  """
+
+  def __init__(self, max_bytes: int = MAX_CACHE_BYTES, spill_dir: str = SPILL_DIR, max_spill_bytes: int = MAX_SPILL_BYTES):
+    self.max_bytes = max_bytes
+    self.spill_dir = spill_dir
+    self.max_spill_bytes = max_spill_bytes
+    self.size = 0
+    self.hits = 0
+    self.misses = 0
+    self._entries: OrderedDict[str, bytes] = OrderedDict()
+    # Size of each spilled image in the order they were written, only touched on the worker
+    self._spilled: OrderedDict[str, int] = OrderedDict()
+    self.spill_size = 0
+    self._executor = None
+    if spill_dir:
+      self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-cache")
+      self._executor.submit(self._index_spilled)
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __contains__(self, key: str) -> bool:
+    return key in self._entries
+
+  async def get(self, key: str):
+    """Returns the cached bytes for key, or None."""
+    data = self._entries.get(key)
+    if data is None and self._executor is not None:
+      loop = asyncio.get_running_loop()
+      data = await loop.run_in_executor(self._executor, self._read_spilled, key)
+      if data is not None:
+        self.put(key, data)
+    if data is None:
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    self._entries.move_to_end(key)
+    return data
+
+  def put(self, key: str, data: bytes):
+    if len(data) > self.max_bytes:
+      return
+    old = self._entries.pop(key, None)
+    if old is not None:
+      self.size -= len(old)
+    self._entries[key] = data
+    self.size += len(data)
+
+    while self.size > self.max_bytes:
+      old_key, old_data = self._entries.popitem(last=False)
+      self.size -= len(old_data)
+      if self._executor is not None:
+        self._executor.submit(self._spill, old_key, old_data)
+
+  def close(self):
+    """Waits for images still being written to disk and stops the worker."""
+    if self._executor is not None:
+      self._executor.shutdown(wait=True)
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.spill_dir, f"{key}.img")
+
+  def _index_spilled(self):
+    """Picks up the images spilled by an earlier run, oldest first."""
+    os.makedirs(self.spill_dir, exist_ok=True)
+    files = []
+    with os.scandir(self.spill_dir) as entries:
+      for entry in entries:
+        if entry.name.endswith(".img"):
+          stat = entry.stat()
+          files.append((stat.st_mtime, stat.st_size, entry.name[:-len(".img")]))
+    for _, size, key in sorted(files):
+      self._spilled[key] = size
+      self.spill_size += size
+    self._prune_spilled()
+
+  def _read_spilled(self, key: str):
+    if key not in self._spilled:
+      return None
+    try:
+      with open(self._path(key), "rb") as f:
+        return f.read()
+    except FileNotFoundError:
+      self.spill_size -= self._spilled.pop(key)
+      return None
+
+  def _spill(self, key: str, data: bytes):
+    if key in self._spilled:
+      return
+    path = self._path(key)
+    try:
+      # Written under a temporary name so a reader never sees half a file
+      with open(path + ".tmp", "wb") as f:
+        f.write(data)
+      os.replace(path + ".tmp", path)
+    except OSError as e:
+      print(f"[WARNING] Couldn't write image to {path}: {e}")
+      return
+    self._spilled[key] = len(data)
+    self.spill_size += len(data)
+    self._prune_spilled()
+
+  def _prune_spilled(self):
+    """Deletes the least recently written images once the spill directory is over its limit."""
+    while self.spill_size > self.max_spill_bytes:
+      key, size = self._spilled.popitem(last=False)
+      self.spill_size -= size
+      try:
+        os.remove(self._path(key))
+      except OSError as e:
+        print(f"[WARNING] Couldn't remove spilled image {key}: {e}")
@@ -0,0 +1,126 @@
+import bisect
+import os
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds, anything slower goes in the last one
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+# Prometheus text file written every METRICS_INTERVAL seconds if set, e.g. for node_exporter's textfile collector
+METRICS_FILE = os.environ.get("CROSSWORD_METRICS_FILE") or None
+METRICS_INTERVAL = 30
+
+
+class Histogram:
+  """Fixed-bucket latency histogram, cheap enough to record every command."""
+  __slots__ = ("counts", "count", "total", "max")
+
+  def __init__(self):
+    self.counts = [0] * len(BUCKETS_MS)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def observe(self, ms: float):
+    self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+    self.count += 1
+    self.total += ms
+    self.max = max(self.max, ms)
+
+  def percentile(self, fraction: float) -> float:
+    """Upper bound of the bucket holding the given fraction of observations, capped at the max seen."""
+    if not self.count:
+      return 0.0
+    rank = fraction * self.count
+    seen = 0
+    for bound, count in zip(BUCKETS_MS, self.counts):
+      seen += count
+      if seen >= rank:
+        return min(bound, self.max)
+    return self.max
+
+
+class Metrics:
+  """Named latency histograms, counters and gauges for one process."""
+
+  def __init__(self):
+    self.histograms: dict[str, Histogram] = {}
+    self.counters: dict[str, int] = {}
+    self.gauges: dict[str, float] = {}
+
+  def observe(self, name: str, ms: float):
+    histogram = self.histograms.get(name)
+    if histogram is None:
+      histogram = self.histograms[name] = Histogram()
+    histogram.observe(ms)
+
+  @contextmanager
+  def span(self, name: str):
+    """Times the block, including any awaits inside it, into the named histogram."""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(name, (time.perf_counter() - start) * 1000)
+
+  def increment(self, name: str, amount: int = 1):
+    self.counters[name] = self.counters.get(name, 0) + amount
+
+  def set_gauge(self, name: str, value: float):
+    """Records the current value of something that goes up and down, like a queue's depth."""
+    self.gauges[name] = value
+
+  def reset(self):
+    self.histograms.clear()
+    self.counters.clear()
+    self.gauges.clear()
+
+  def format_table(self) -> str:
+    """Plain text summary of every span, counter and gauge, for /stats."""
+    lines = [f"{'span':<24} {'count':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+    for name, histogram in sorted(self.histograms.items()):
+      lines.append(
+        f"{name:<24} {histogram.count:>7} {histogram.total / histogram.count:>8.1f} {histogram.percentile(0.5):>8.1f}"
+        f" {histogram.percentile(0.95):>8.1f} {histogram.percentile(0.99):>8.1f} {histogram.max:>8.1f}"
+      )
+    if self.counters:
+      lines.append("")
+      lines.extend(f"{name:<24} {value:>7}" for name, value in sorted(self.counters.items()))
+    if self.gauges:
+      lines.append("")
+      lines.extend(f"{name:<24} {value:>7g}" for name, value in sorted(self.gauges.items()))
+    return "\n".join(lines)
+
+  def prometheus_text(self) -> str:
+    """Every span, counter and gauge in the Prometheus text exposition format."""
+    lines = [
+      "# HELP crossword_span_milliseconds Time spent in each stage of the crossword commands.",
+      "# TYPE crossword_span_milliseconds histogram",
+    ]
+    for name, histogram in sorted(self.histograms.items()):
+      cumulative = 0
+      for bound, count in zip(BUCKETS_MS, histogram.counts):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+        lines.append(f'crossword_span_milliseconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+      lines.append(f'crossword_span_milliseconds_sum{{span="{name}"}} {histogram.total:.3f}')
+      lines.append(f'crossword_span_milliseconds_count{{span="{name}"}} {histogram.count}')
+
+    lines.append("# HELP crossword_events_total Counted crossword events.")
+    lines.append("# TYPE crossword_events_total counter")
+    for name, value in sorted(self.counters.items()):
+      lines.append(f'crossword_events_total{{event="{name}"}} {value}')
+
+    lines.append("# HELP crossword_gauge Current values, such as queue depths.")
+    lines.append("# TYPE crossword_gauge gauge")
+    for name, value in sorted(self.gauges.items()):
+      lines.append(f'crossword_gauge{{name="{name}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+  def write_prometheus(self, path: str):
+    # Written under a temporary name so a scrape never sees half a file
+    with open(path + ".tmp", "w") as f:
+      f.write(self.prometheus_text())
+    os.replace(path + ".tmp", path)
+
+
+metrics = Metrics()
@@ -0,0 +1,130 @@
+import os
+import random
+import threading
+import time
+from functools import partial
+
+# cProfile, pstats and tracemalloc are only imported once a command is sampled
+
+# Profiling is off unless a directory for the dumps is given
+PROFILE_DIR = os.environ.get("CROSSWORD_PROFILE_DIR") or None
+# Fraction of commands profiled while it's on
+PROFILE_SAMPLE_RATE = float(os.environ.get("CROSSWORD_PROFILE_SAMPLE", "0.1"))
+# Dumps kept per command, older ones are deleted
+PROFILE_KEEP = int(os.environ.get("CROSSWORD_PROFILE_KEEP", "20"))
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 25
+
+
+class ProfileSession:
+  """One sampled command: a profile of the event loop plus any render jobs it ran."""
+  __slots__ = ("name", "profile", "worker_profiles", "started", "lock", "owns_tracemalloc")
+
+  def __init__(self, name: str):
+    import cProfile
+
+    self.name = name
+    self.profile = cProfile.Profile()
+    self.worker_profiles: list = []
+    self.started = time.time()
+    self.lock = threading.Lock()
+    self.owns_tracemalloc = False
+
+
+def _profiled_call(session: ProfileSession, fn, *args, **kwargs):
+  import cProfile
+
+  profile = cProfile.Profile()
+  try:
+    return profile.runcall(fn, *args, **kwargs)
+  finally:
+    with session.lock:
+      session.worker_profiles.append(profile)
+
+
+class CommandProfiler:
+  """
+  Samples command handlers with cProfile and tracemalloc and writes a dump per command.
+
+  Each sampled command leaves <command>-<time>.prof, for pstats or snakeviz, and a matching
+  .mem.txt with its largest allocations. Only one command is profiled at a time. The event
+  loop keeps running other tasks while a command awaits, so their calls show up in its
+  profile too. Render jobs run in worker threads are profiled separately and merged in.
+  """
+
+  def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE, keep: int = PROFILE_KEEP):
+    self.directory = directory
+    self.sample_rate = sample_rate
+    self.keep = keep
+    self._session: ProfileSession = None
+
+  @property
+  def enabled(self) -> bool:
+    return self.directory is not None and self.sample_rate > 0
+
+  def start(self, name: str):
+    """Starts profiling a command if it is picked for sampling. Returns the session or None."""
+    if not self.enabled or self._session is not None or random.random() >= self.sample_rate:
+      return None
+    import tracemalloc
+
+    session = self._session = ProfileSession(name)
+    # Something else may already be tracing allocations, in which case it is left running
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(TRACEMALLOC_FRAMES)
+      session.owns_tracemalloc = True
+    session.profile.enable()
+    return session
+
+  def wrap(self, fn):
+    """Returns fn set up to be profiled into the current session when run in a worker thread."""
+    if self._session is None:
+      return fn
+    return partial(_profiled_call, self._session, fn)
+
+  def stop(self, session: ProfileSession):
+    """Finishes a session and writes its dumps. Returns the path of the .prof file."""
+    import pstats
+    import tracemalloc
+
+    session.profile.disable()
+    self._session = None
+    snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+    _, peak = tracemalloc.get_traced_memory()
+    if session.owns_tracemalloc:
+      tracemalloc.stop()
+
+    os.makedirs(self.directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(session.started))
+    base = os.path.join(self.directory, f"{session.name}-{stamp}-{int(session.started * 1000) % 1000:03d}")
+
+    stats = pstats.Stats(session.profile)
+    with session.lock:
+      for profile in session.worker_profiles:
+        stats.add(profile)
+    stats.dump_stats(base + ".prof")
+
+    with open(base + ".mem.txt", "w") as f:
+      f.write(f"peak traced memory: {peak / 1024:.1f} KB\n\n")
+      if snapshot is not None:
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+          f.write(f"{stat}\n")
+
+    self._rotate(session.name)
+    return base + ".prof"
+
+  def _rotate(self, name: str):
+    """Deletes the oldest dumps for a command beyond the newest `keep`."""
+    prefix = f"{name}-"
+    dumps = sorted(
+      entry for entry in os.listdir(self.directory)
+      if entry.startswith(prefix) and entry.endswith(".prof")
+    )
+    for old in dumps[:max(0, len(dumps) - self.keep)]:
+      base = os.path.join(self.directory, old[:-len(".prof")])
+      for path in (base + ".prof", base + ".mem.txt"):
+        if os.path.exists(path):
+          os.remove(path)
+
+
+profiler = CommandProfiler()
@@ -0,0 +1,70 @@
+import asyncio
+import copy
+from collections import OrderedDict
+
+# Only the last few days are ever asked for, older entries are dropped
+MAX_CACHED_PUZZLES = 8
+
+
+class PuzzleCache:
+  """
+  Process-wide cache of parsed puzzles keyed by (source, puzzle_date).
+
+  Entries hold the parsed output of a puzzle (grid and clues). Callers always get
+  a deep copy back, so a thread can fill in answers without touching the cached puzzle.
+  Concurrent requests for the same missing puzzle share a single fetch.
+  """
+
+  def __init__(self, max_entries: int = MAX_CACHED_PUZZLES):
+    self.max_entries = max_entries
+    self._entries: OrderedDict[tuple[str, str], tuple] = OrderedDict()
+    self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+
+  def __contains__(self, key: tuple[str, str]) -> bool:
+    return key in self._entries
+
+  def get(self, source: str, puzzle_date: str):
+    """Returns a copy of the cached puzzle, or None if it hasn't been fetched yet."""
+    entry = self._entries.get((source, puzzle_date))
+    if entry is None:
+      return None
+    self._entries.move_to_end((source, puzzle_date))
+    return copy.deepcopy(entry)
+
+  def peek(self, source: str, puzzle_date: str):
+    """Returns the cached puzzle itself without copying it. Must not be modified."""
+    return self._entries.get((source, puzzle_date))
+
+  def put(self, source: str, puzzle_date: str, puzzle: tuple):
+    self._entries[(source, puzzle_date)] = copy.deepcopy(puzzle)
+    self._entries.move_to_end((source, puzzle_date))
+    while len(self._entries) > self.max_entries:
+      old_key, _ = self._entries.popitem(last=False)
+      self._locks.pop(old_key, None)
+
+  async def get_or_fetch(self, source: str, puzzle_date: str, fetch):
+    """
+    Returns a copy of the cached puzzle, calling `fetch` to load it if needed.
+
+    Args:
+        source (str): Puzzle source, e.g. "metrocryptic".
+        puzzle_date (str): Date of the puzzle in YYYY-MM-DD form.
+        fetch (callable): Coroutine function returning the parsed puzzle.
+
+    Returns:
+        tuple: A private copy of the parsed puzzle.
+    """
+    key = (source, puzzle_date)
+    if key in self._entries:
+      return self.get(source, puzzle_date)
+
+    lock = self._locks.setdefault(key, asyncio.Lock())
+    async with lock:
+      # Someone else may have finished the fetch while we waited
+      if key not in self._entries:
+        self.put(source, puzzle_date, await fetch())
+    return self.get(source, puzzle_date)
+
+
+# Shared by every cog in the process
+puzzle_cache = PuzzleCache()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# "thread" or "process"
+DEFAULT_MODE = "thread"
+DEFAULT_WORKERS = 2
+# Jobs allowed to wait for a worker before callers are made to wait as well
+DEFAULT_MAX_QUEUED = 16
+
+
+class RenderExecutor:
+  """
+  Runs rendering and image encoding jobs away from the event loop.
+
+  Jobs go to a thread or process pool. At most `workers + max_queued` jobs are submitted
+  at once, anything beyond that waits its turn so a burst of answers can't pile up an
+  unbounded backlog of renders.
+
+  Defaults can be overridden with the CROSSWORD_RENDER_MODE, CROSSWORD_RENDER_WORKERS and
+  CROSSWORD_RENDER_QUEUE environment variables.
+  """
+
+  def __init__(self, mode: str = None, workers: int = None, max_queued: int = None):
+    self.mode = mode or os.getenv("CROSSWORD_RENDER_MODE", DEFAULT_MODE)
+    self.workers = workers or int(os.getenv("CROSSWORD_RENDER_WORKERS", DEFAULT_WORKERS))
+    if max_queued is None:
+      max_queued = int(os.getenv("CROSSWORD_RENDER_QUEUE", DEFAULT_MAX_QUEUED))
+    self.max_queued = max_queued
+
+    if self.mode == "thread":
+      self._pool: Executor = ThreadPoolExecutor(self.workers, thread_name_prefix="crossword-render")
+    elif self.mode == "process":
+      self._pool = ProcessPoolExecutor(self.workers)
+    else:
+      raise ValueError(f"Unknown render mode '{self.mode}'. Use 'thread' or 'process'.")
+
+    self._slots = asyncio.Semaphore(self.workers + self.max_queued)
+    self._in_flight = 0
+    # Optional callable that wraps each job before it goes to a thread worker, e.g. to profile it
+    self.job_wrapper = None
+
+  @property
+  def in_flight(self) -> int:
+    """Jobs currently running or queued in the pool."""
+    return self._in_flight
+
+  async def run(self, fn, *args, **kwargs):
+    """Runs fn(*args, **kwargs) in the pool and returns its result."""
+    async with self._slots:
+      self._in_flight += 1
+      try:
+        if self.job_wrapper is not None and self.mode == "thread":
+          fn = self.job_wrapper(fn)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+      finally:
+        self._in_flight -= 1
+
+  def shutdown(self):
+    self._pool.shutdown(wait=False, cancel_futures=True)
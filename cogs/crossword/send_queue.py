@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+import discord
+
+from cogs.crossword.metrics import metrics
+
+# Lower goes first within a channel. Followups answer someone's command and the interaction
+# token behind them runs out, image updates come next and notices like "complete!" last.
+PRIORITY_FOLLOWUP = 0
+PRIORITY_UPDATE = 1
+PRIORITY_INFO = 2
+# Tries per message, counting the first. py-cord has already waited out a few 429s of its
+# own by the time one reaches us.
+MAX_SEND_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+
+def retry_delay(error: discord.HTTPException, attempt: int):
+  """Seconds to wait before trying a send again after error, or None if it shouldn't be retried."""
+  status = getattr(error, "status", 0)
+  if status != 429 and status < 500:
+    return None
+
+  # Exponential with jitter, so channels that were throttled together don't retry together
+  delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+  headers = getattr(getattr(error, "response", None), "headers", None) or {}
+  try:
+    return max(delay, float(headers.get("Retry-After", 0)))
+  except (TypeError, ValueError):
+    return delay
+
+
+class SendQueue:
+  """
+  Outbound messages queued per channel, sent one at a time in priority order.
+
+  Every channel gets its own worker, so a channel that is being rate limited only holds up
+  its own messages. Sends that fail with a 429 or a server error are retried with backoff
+  before the error is handed back to whoever queued them.
+  """
+
+  def __init__(self, max_attempts: int = MAX_SEND_ATTEMPTS, sleep=asyncio.sleep):
+    self.max_attempts = max_attempts
+    self._sleep = sleep
+    # channel id -> heap of (priority, sequence, queued at, send, future)
+    self._queues: dict[int, list] = {}
+    self._workers: dict[int, asyncio.Task] = {}
+    self._sequence = itertools.count()
+
+  def depth(self, channel_id: int = None) -> int:
+    """Messages waiting in one channel, or in all of them."""
+    if channel_id is not None:
+      return len(self._queues.get(channel_id, ()))
+    return sum(len(queue) for queue in self._queues.values())
+
+  def __len__(self) -> int:
+    """Channels with messages waiting or being sent."""
+    return len(self._workers)
+
+  async def send(self, channel_id: int, send, priority: int = PRIORITY_UPDATE):
+    """
+    Queues a message for channel_id and returns what sending it returned.
+
+    send is called with no arguments and must return a new coroutine each time, as a retry
+    can't reuse the last one. Build any discord.File inside it for the same reason.
+    """
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(
+      self._queues.setdefault(channel_id, []), (priority, next(self._sequence), time.perf_counter(), send, future)
+    )
+    self._record_depth()
+    if channel_id not in self._workers:
+      self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+    return await future
+
+  async def _drain(self, channel_id: int):
+    queue = self._queues[channel_id]
+    future = None
+    try:
+      while queue:
+        _, _, queued, send, future = heapq.heappop(queue)
+        self._record_depth()
+        # Whoever queued it stopped waiting, so there's nobody to send it for
+        if future.done():
+          continue
+        metrics.observe("send.wait", (time.perf_counter() - queued) * 1000)
+        try:
+          result = await self._attempt(send)
+        except Exception as e:
+          if not future.done():
+            future.set_exception(e)
+        else:
+          if not future.done():
+            future.set_result(result)
+    finally:
+      # Cancelled during shutdown, so nothing left will be sent
+      if future is not None:
+        future.cancel()
+      for _, _, _, _, waiting in queue:
+        waiting.cancel()
+      queue.clear()
+      del self._queues[channel_id]
+      del self._workers[channel_id]
+      self._record_depth()
+
+  async def _attempt(self, send):
+    for attempt in range(self.max_attempts):
+      try:
+        return await send()
+      except discord.HTTPException as e:
+        delay = retry_delay(e, attempt)
+        if delay is None or attempt == self.max_attempts - 1:
+          raise
+        metrics.increment("send.retried")
+        await self._sleep(delay)
+
+  def _record_depth(self):
+    metrics.set_gauge("send_queue.depth", self.depth())
+    metrics.set_gauge("send_queue.channels", len(self._queues))
+
+  def close(self):
+    """Cancels every queued message."""
+    for worker in list(self._workers.values()):
+      worker.cancel()
@@ -0,0 +1,55 @@
+from cogs.crossword.getMetro import fetchPuzzleFragments, parsePuzzle
+
+
+class PuzzleSource:
+  """
+  Somewhere a daily puzzle comes from.
+
+  fetch() returns the raw HTML fragments and parse() turns them into (grid, clues),
+  the same as parsePuzzle. From there every source goes through the same cache, drawing and
+  database code. A site laid out differently overrides these two.
+  """
+
+  def __init__(self, name: str, title: str, url: str):
+    # Stored in the database's source column, so it mustn't change once puzzles exist
+    self.name = name
+    # Shown to people, e.g. in thread names
+    self.title = title
+    self.url = url
+
+  async def fetch(self, pool=None, session=None) -> tuple:
+    return await fetchPuzzleFragments(self.url, pool=pool, session=session)
+
+  def parse(self, fragments: tuple) -> tuple:
+    return parsePuzzle(*fragments)
+
+  def __repr__(self) -> str:
+    return f"{type(self).__name__}({self.name!r})"
+
+
+class MetroSource(PuzzleSource):
+  """A Metro puzzle page. Each puzzle is its own page, all with the same #puzzle-grid layout."""
+
+
+# By name, in the order they're offered in commands
+SOURCES: dict[str, PuzzleSource] = {}
+
+
+def register_source(source: PuzzleSource) -> PuzzleSource:
+  if source.name in SOURCES:
+    raise ValueError(f"A source called {source.name!r} is already registered")
+  SOURCES[source.name] = source
+  return source
+
+
+def get_source(name: str) -> PuzzleSource:
+  """Returns the registered source called name, raising KeyError if there isn't one."""
+  return SOURCES[name]
+
+
+METRO_CRYPTIC = register_source(MetroSource(
+  "metrocryptic", "Metro Cryptic", "https://metro.co.uk/puzzles/cryptic-crosswords-online-free-daily-word-puzzle/"
+))
+METRO_QUICK = register_source(MetroSource(
+  "metroquick", "Metro Quick", "https://metro.co.uk/puzzles/quick-crossword"
+))
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import database as db
+
+# Running puzzles kept in memory at once
+MAX_CACHED_STATES = 100
+# Puzzles nobody has touched for this long are dropped from memory
+IDLE_SECONDS = 30 * 60
+# Attempts at writing a puzzle back before its changes are left for the next flush
+MAX_FLUSH_ATTEMPTS = 3
+
+
+class _CachedPuzzle:
+  """A puzzle's state plus the changes that haven't been written to the database yet."""
+  __slots__ = ("state", "dirty_cells", "dirty_clues", "last_used")
+
+  def __init__(self, state: dict):
+    self.state = state
+    self.dirty_cells: set[tuple[int, int]] = set()
+    self.dirty_clues: set[str] = set()
+    self.last_used = time.monotonic()
+
+  @property
+  def dirty(self) -> bool:
+    return bool(self.dirty_cells or self.dirty_clues)
+
+
+class PuzzleStateCache:
+  """
+  In-memory LRU of running puzzles keyed by thread_id, written back to SQLite in the background.
+
+  get() serves reads from memory after the first load. Changes go through apply(), which never
+  awaits, so it is atomic with respect to other commands on the event loop. They are written as
+  deltas by flush(), which the owner calls on a short interval and at shutdown. Idle puzzles are
+  dropped by evict(), but never before their changes have been written.
+
+  Writes are compare-and-swapped against the row's version as well. If another writer got
+  there first, their changes are merged into the cached puzzle (ours win on the cells and
+  clues we changed), on_reconcile is called with the thread_id and the write is retried.
+  """
+
+  def __init__(self, store: db.AsyncDatabase = None, max_entries: int = MAX_CACHED_STATES, idle_seconds: float = IDLE_SECONDS):
+    self.store = store or db.store
+    self.max_entries = max_entries
+    self.idle_seconds = idle_seconds
+    self._entries: OrderedDict[int, _CachedPuzzle] = OrderedDict()
+    self._loading: dict[int, asyncio.Lock] = {}
+    self._flush_lock = asyncio.Lock()
+    self.on_reconcile = None
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __contains__(self, thread_id: int) -> bool:
+    return thread_id in self._entries
+
+  def _touch(self, thread_id: int) -> _CachedPuzzle:
+    entry = self._entries[thread_id]
+    entry.last_used = time.monotonic()
+    self._entries.move_to_end(thread_id)
+    return entry
+
+  def put(self, state: dict):
+    """Caches a puzzle that has just been written to the database."""
+    self._entries[state["thread_id"]] = _CachedPuzzle(state)
+    self._touch(state["thread_id"])
+
+  def discard(self, thread_id: int):
+    """Forgets a puzzle whose row has been deleted, along with any changes not yet written."""
+    self._entries.pop(thread_id, None)
+    self._loading.pop(thread_id, None)
+
+  async def get(self, thread_id: int):
+    """Returns the live state of a puzzle, loading it from the database if it isn't cached."""
+    if thread_id in self._entries:
+      return self._touch(thread_id).state
+
+    lock = self._loading.setdefault(thread_id, asyncio.Lock())
+    async with lock:
+      if thread_id not in self._entries:
+        state = await self.store.get_puzzle_state(thread_id)
+        if state is None:
+          self._loading.pop(thread_id, None)
+          return None
+        self._entries[thread_id] = _CachedPuzzle(state)
+    self._loading.pop(thread_id, None)
+    return self._touch(thread_id).state
+
+  def mark_dirty(self, thread_id: int, changed_cells=(), changed_clues=()):
+    """Records cells and clues of a cached puzzle that need writing back."""
+    entry = self._touch(thread_id)
+    entry.dirty_cells.update((x, y) for x, y in changed_cells)
+    entry.dirty_clues.update(changed_clues)
+
+  def apply(self, thread_id: int, letters: dict, statuses: dict):
+    """
+    Applies changes to a cached puzzle and queues them to be written.
+
+    The puzzle must be cached, e.g. just returned by get(). Work the changes out from that state
+    without awaiting in between and nothing else can change it first.
+
+    Args:
+        thread_id (int): The puzzle's thread.
+        letters (dict): New letter for each changed (x, y), "" to clear it.
+        statuses (dict): New status for each changed clue reference.
+    """
+    entry = self._entries[thread_id]
+    grid = entry.state["cells"]
+    for (x, y), letter in letters.items():
+      grid.set_letter(x, y, letter)
+    for ref, status in statuses.items():
+      entry.state["clues"][ref]["status"] = status
+    self.mark_dirty(thread_id, letters, statuses)
+
+  async def set_status(self, thread_id: int, status: str):
+    """Updates a puzzle's status, which is written straight through."""
+    if thread_id in self._entries:
+      self._touch(thread_id).state["status"] = status
+    await self.store.update_puzzle_status(thread_id, status)
+
+  async def flush(self):
+    """Writes every outstanding change to the database."""
+    async with self._flush_lock:
+      for thread_id, entry in list(self._entries.items()):
+        if not entry.dirty:
+          continue
+        cells, clues = entry.dirty_cells, entry.dirty_clues
+        entry.dirty_cells, entry.dirty_clues = set(), set()
+        try:
+          for _ in range(MAX_FLUSH_ATTEMPTS):
+            written = await self.store.update_puzzle_cells(
+              thread_id, entry.state, cells, clues, expected_version=entry.state["version"]
+            )
+            if written:
+              break
+            await self._reconcile(thread_id, entry, cells, clues)
+          else:
+            raise RuntimeError(f"Puzzle {thread_id} kept changing underneath us, will retry")
+        except BaseException:
+          # Keep the changes so the next flush, or flush_sync if this was cancelled at shutdown, tries again
+          entry.dirty_cells |= cells
+          entry.dirty_clues |= clues
+          raise
+
+  async def _reconcile(self, thread_id: int, entry: _CachedPuzzle, pending_cells, pending_clues):
+    """Merges a newer stored version of a puzzle into the cached one, keeping our own changes."""
+    stored = await self.store.get_puzzle_state(thread_id)
+    if stored is None:
+      return
+
+    state, grid = entry.state, entry.state["cells"]
+    ours_cells = pending_cells | entry.dirty_cells
+    ours_clues = pending_clues | entry.dirty_clues
+    grid.merge_letters(stored["cells"], keep=(grid.index(x, y) for x, y in ours_cells))
+    for ref, clue in state["clues"].items():
+      if ref not in ours_clues and ref in stored["clues"]:
+        clue["status"] = stored["clues"][ref]["status"]
+    state["status"] = stored["status"]
+    state["version"] = stored["version"]
+
+    if self.on_reconcile is not None:
+      self.on_reconcile(thread_id)
+
+  def flush_sync(self):
+    """
+    Writes every outstanding change using blocking connections, for use during shutdown.
+    There's no chance to merge at that point, so these writes skip the version check.
+    """
+    for thread_id, entry in self._entries.items():
+      if entry.dirty:
+        db.update_puzzle_cells(thread_id, entry.state, entry.dirty_cells, entry.dirty_clues)
+        entry.dirty_cells, entry.dirty_clues = set(), set()
+
+  def evict(self):
+    """Drops idle puzzles and trims the cache to max_entries, skipping any with unsaved changes."""
+    cutoff = time.monotonic() - self.idle_seconds
+    over = len(self._entries) - self.max_entries
+    for thread_id, entry in list(self._entries.items()):
+      if entry.dirty:
+        continue
+      if over > 0 or entry.last_used < cutoff:
+        del self._entries[thread_id]
+        over -= 1
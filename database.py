@@ -1,8 +1,23 @@
+import asyncio
 import sqlite3
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from cogs.crossword.grid import Grid, index_clues
 
 DB_FILE = 'bot_data.db'
 
+# Applied to every long-lived connection
+PRAGMAS = (
+  "PRAGMA journal_mode = WAL",
+  "PRAGMA synchronous = NORMAL",
+  "PRAGMA temp_store = MEMORY",
+  "PRAGMA cache_size = -8000",
+  "PRAGMA busy_timeout = 5000",
+)
+# Number of compiled statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 64
+
 # Create database
 def setup_database():
   connection = sqlite3.connect(DB_FILE)
@@ -19,15 +34,37 @@ def setup_database():
             height INTEGER NOT NULL,
             cells_json TEXT NOT NULL,
             clues_json TEXT NOT NULL,
+            fill TEXT,
+            solved TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
             UNIQUE(channel_id, puzzle_date, source)
         )
     """)
+
+  # Tables created before fill state was packed or versioned are missing these columns
+  columns = {row[1] for row in cursor.execute("PRAGMA table_info(crosswords)")}
+  for column, definition in (("fill", "TEXT"), ("solved", "TEXT"), ("version", "INTEGER NOT NULL DEFAULT 0")):
+    if column not in columns:
+      cursor.execute(f"ALTER TABLE crosswords ADD COLUMN {column} {definition}")
+
+  # Finds the last puzzle from a source, to tell whether the site has published a new one yet
+  cursor.execute("CREATE INDEX IF NOT EXISTS crosswords_source_date ON crosswords(source, puzzle_date)")
+
+  # Channels that get each day's puzzle posted without running a command
+  cursor.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            channel_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            source TEXT NOT NULL,
+            PRIMARY KEY(channel_id, source)
+        )
+    """)
+
   connection.commit()
   connection.close()
 
 # Check if a crossword exists
-def check_puzzle_exists(channel_id: int, puzzle: str, source: str):
-  connection = sqlite3.connect(DB_FILE)
+def _check_puzzle_exists(connection: sqlite3.Connection, channel_id: int, puzzle: str, source: str):
   cursor = connection.cursor()
 
   # noinspection PyTypeChecker
@@ -43,63 +80,106 @@ def check_puzzle_exists(channel_id: int, puzzle: str, source: str):
   # Return either single thread_id or None
   result = cursor.fetchone()
 
-  connection.close()
-
   if result:
     return result[0]  # Return the thread_id itself
   else:
     return None
 
+# Packed fill state:
+#  fill   - Grid.fill, one character per cell in row order
+#  solved - one character per clue in clues_json order, SOLVED or UNSOLVED
+# cells_json holds Grid.layout() and clues_json the clues without their status, including
+# the cells each one fills. Both are written once when the puzzle is created, and the
+# cell_clues index of the state is rebuilt from the clues' cells on load.
+SOLVED = "1"
+UNSOLVED = "0"
+
+
+def _pack_solved(clues_dict: dict) -> str:
+  return "".join(SOLVED if clue["status"] == "solved" else UNSOLVED for clue in clues_dict.values())
+
+
+def _clues_layout_json(clues_dict: dict) -> str:
+  return json.dumps({ref: {k: v for k, v in clue.items() if k != "status"} for ref, clue in clues_dict.items()})
+
+
+def _add_clue_cells(clues_dict: dict, grid: Grid) -> dict:
+  for clue in clues_dict.values():
+    if "cells" in clue:
+      clue["cells"] = [tuple(cell) for cell in clue["cells"]]
+    else:
+      # Puzzles parsed before each clue's cells were worked out up front
+      clue["cells"] = grid.slot(clue["start"], sum(clue["lengths"]), clue["direction"])
+  return clues_dict
+
+
+def _load_grid(cells_json: str, width: int, height: int, fill) -> Grid:
+  layout = json.loads(cells_json)
+  if "labels" in layout:
+    return Grid.from_layout(layout, fill)
+
+  # Rows from before the Grid was introduced store a dictionary of cells keyed by "x,y"
+  cells_dict = {tuple(map(int, k.split(','))): v for k, v in layout.items()}
+  grid = Grid.from_cells(cells_dict, width, height)
+  if fill is not None:
+    grid.load_fill(fill)
+  return grid
+
+
 # Add new crossword to table
-def create_puzzle(thread_id: int, channel_id: str, puzzle_date: str, source: str, width: int, height: int, cells_dict: dict, clues_dict: dict):
-  """Inserts a new puzzle record into the database."""
-  # Convert sets to lists inside the nested cell data
-  for cell_data in cells_dict.values():
-    if 'clues' in cell_data and isinstance(cell_data['clues'], set):
-      cell_data['clues'] = list(cell_data['clues'])
-
-  # Convert tuple keys to strings for JSON compatibility
-  cells_json_compatible = {f"{x},{y}": v for (x, y), v in cells_dict.items()}
-  cells_json = json.dumps(cells_json_compatible)
-
-  clues_json = json.dumps(clues_dict)
+def _create_puzzle(connection: sqlite3.Connection, thread_id: int, channel_id: str, puzzle_date: str, source: str, width: int, height: int, grid: Grid, clues_dict: dict):
+  _add_clue_cells(clues_dict, grid)
+  cells_json = json.dumps(grid.layout())
+  clues_json = _clues_layout_json(clues_dict)
   status = "running"
 
-  connection = sqlite3.connect(DB_FILE)
   cursor = connection.cursor()
   # noinspection PyTypeChecker
   cursor.execute(
-    "INSERT INTO crosswords (thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-    (thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json)
+    "INSERT INTO crosswords (thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json, fill, solved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    (thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json, grid.fill, _pack_solved(clues_dict))
   )
   connection.commit()
-  connection.close()
+
+  # Same shape as get_puzzle_state
+  return {
+    "thread_id": thread_id,
+    "channel_id": channel_id,
+    "puzzle_date": puzzle_date,
+    "source": source,
+    "status": status,
+    "width": width,
+    "height": height,
+    "cells": grid,
+    "clues": clues_dict,
+    "cell_clues": index_clues(clues_dict),
+    "version": 0
+  }
 
 
 # Retrieve a puzzles current state
-def get_puzzle_state(thread_id: int):
-  """Retrieves a puzzle's state from the database and returns it as a Python dictionary."""
-  connection = sqlite3.connect(DB_FILE)
+def _get_puzzle_state(connection: sqlite3.Connection, thread_id: int):
   cursor = connection.cursor()
   # noinspection PyTypeChecker
-  cursor.execute("SELECT * FROM crosswords WHERE thread_id = ?", (thread_id,))
+  cursor.execute(
+    "SELECT thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json, fill, solved, version FROM crosswords WHERE thread_id = ?",
+    (thread_id,)
+  )
   row = cursor.fetchone()
-  connection.close()
 
   if not row:
     return None
 
-    # Load and convert keys from JSON string
-  cells_from_db = json.loads(row[7])
-  cells_dict = {tuple(map(int, k.split(','))): v for k, v in cells_from_db.items()}
+  fill, solved = row[9], row[10]
+  grid = _load_grid(row[7], row[5], row[6], fill)
+  clues_dict = _add_clue_cells(json.loads(row[8]), grid)
 
-  # Convert lists back to sets inside the nested cell data
-  for cell_data in cells_dict.values():
-    if 'clues' in cell_data and isinstance(cell_data['clues'], list):
-      cell_data['clues'] = set(cell_data['clues'])
+  if solved is not None:
+    for clue, flag in zip(clues_dict.values(), solved):
+      clue["status"] = "solved" if flag == SOLVED else "unsolved"
 
   # Unpack the row and build the final state dictionary
-  return {
+  state = {
     "thread_id": row[0],
     "channel_id": row[1],
     "puzzle_date": row[2],
@@ -107,41 +187,111 @@ def get_puzzle_state(thread_id: int):
     "status": row[4],
     "width": row[5],
     "height": row[6],
-    "cells": cells_dict,
-    "clues": json.loads(row[8])
+    "cells": grid,
+    "clues": clues_dict,
+    "cell_clues": index_clues(clues_dict),
+    "version": row[11]
   }
 
+  # Rows written before the packed columns existed keep their fill state in the JSON
+  if fill is None or solved is None:
+    _write_fill(cursor, thread_id, grid, clues_dict)
+    connection.commit()
+
+  return state
+
+
+def _write_fill(cursor: sqlite3.Cursor, thread_id: int, grid: Grid, clues_dict: dict):
+  # The layout never changes, so only the packed fill state is rewritten
+  # noinspection PyTypeChecker
+  cursor.execute(
+    "UPDATE crosswords SET fill = ?, solved = ? WHERE thread_id = ?",
+    (grid.fill, _pack_solved(clues_dict), thread_id)
+  )
+
+
+def _next_version(cursor: sqlite3.Cursor, thread_id: int, expected_version):
+  """
+  Moves a row on to its next version as the first step of a write.
+
+  Returns the new version, or None if the row is missing or isn't at expected_version, in
+  which case nothing has been changed. Without an expected_version the write always goes ahead.
+  """
+  if expected_version is None:
+    # noinspection PyTypeChecker
+    cursor.execute("UPDATE crosswords SET version = version + 1 WHERE thread_id = ?", (thread_id,))
+  else:
+    # noinspection PyTypeChecker
+    cursor.execute(
+      "UPDATE crosswords SET version = version + 1 WHERE thread_id = ? AND version = ?",
+      (thread_id, expected_version)
+    )
+  if cursor.rowcount != 1:
+    return None
+  # noinspection PyTypeChecker
+  return cursor.execute("SELECT version FROM crosswords WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
 
 # Update crossword
-def update_puzzle_state(thread_id: int, new_cells: dict, new_clues: dict):
-  """Updates the cells and clues JSON for a given puzzle."""
+def _update_puzzle_state(connection: sqlite3.Connection, thread_id: int, grid: Grid, new_clues: dict, expected_version: int = None):
+  cursor = connection.cursor()
+  version = _next_version(cursor, thread_id, expected_version)
+  if version is None:
+    connection.rollback()
+    return None
 
-  # Convert sets to lists inside the nested cell data
-  for cell_data in new_cells.values():
-    if 'clues' in cell_data and isinstance(cell_data['clues'], set):
-      cell_data['clues'] = list(cell_data['clues'])
+  _write_fill(cursor, thread_id, grid, new_clues)
+  connection.commit()
+  return version
 
-  # Convert tuple keys to strings for JSON compatibility
-  cells_json_compatible = {f"{x},{y}": v for (x, y), v in new_cells.items()}
-  cells_json = json.dumps(cells_json_compatible)
 
-  clues_json = json.dumps(new_clues)
+def _runs(positions: dict) -> list[tuple[int, str]]:
+  """Groups {index: character} into (start index, characters) runs of neighbouring indexes."""
+  runs = []
+  for index in sorted(positions):
+    if runs and runs[-1][0] + len(runs[-1][1]) == index:
+      runs[-1] = (runs[-1][0], runs[-1][1] + positions[index])
+    else:
+      runs.append((index, positions[index]))
+  return runs
+
+
+# Write only the changed part of the fill state
+def _update_puzzle_cells(connection: sqlite3.Connection, thread_id: int, state: dict, changed_cells, changed_clues, expected_version: int = None):
+  grid = state["cells"]
+  fill = grid.fill
+  fill_changes = {grid.index(x, y): fill[grid.index(x, y)] for x, y in changed_cells if (x, y) in grid}
+
+  clue_positions = {ref: i for i, ref in enumerate(state["clues"])}
+  solved_changes = {
+    clue_positions[ref]: SOLVED if state["clues"][ref]["status"] == "solved" else UNSOLVED
+    for ref in changed_clues
+  }
 
-  connection = sqlite3.connect(DB_FILE)
   cursor = connection.cursor()
+  version = _next_version(cursor, thread_id, expected_version)
+  if version is None:
+    connection.rollback()
+    return False
+
+  # substr is 1-indexed, the runs are 0-indexed
   # noinspection PyTypeChecker
-  cursor.execute(
-    "UPDATE crosswords SET cells_json = ?, clues_json = ? WHERE thread_id = ?",
-    (cells_json, clues_json, thread_id)
+  cursor.executemany(
+    "UPDATE crosswords SET fill = substr(fill, 1, ?) || ? || substr(fill, ?) WHERE thread_id = ?",
+    [(start, chars, start + len(chars) + 1, thread_id) for start, chars in _runs(fill_changes)]
+  )
+  # noinspection PyTypeChecker
+  cursor.executemany(
+    "UPDATE crosswords SET solved = substr(solved, 1, ?) || ? || substr(solved, ?) WHERE thread_id = ?",
+    [(start, chars, start + len(chars) + 1, thread_id) for start, chars in _runs(solved_changes)]
   )
   connection.commit()
-  connection.close()
+  state["version"] = version
+  return True
 
 
 # Update puzzle status
-def update_puzzle_status(thread_id: int, status: str):
-  """Updates the status column for a specific puzzle."""
-  connection = sqlite3.connect(DB_FILE)
+def _update_puzzle_status(connection: sqlite3.Connection, thread_id: int, status: str):
   cursor = connection.cursor()
 
   # noinspection PyTypeChecker
@@ -151,4 +301,214 @@ def update_puzzle_status(thread_id: int, status: str):
   )
 
   connection.commit()
-  connection.close()
+
+
+def _get_previous_clue_texts(connection: sqlite3.Connection, source: str, puzzle_date: str):
+  """Text of each clue of the latest puzzle from source before puzzle_date, or None if there isn't one."""
+  cursor = connection.cursor()
+  cursor.execute(
+    "SELECT clues_json FROM crosswords WHERE source = ? AND puzzle_date < ? ORDER BY puzzle_date DESC LIMIT 1",
+    (source, puzzle_date)
+  )
+  row = cursor.fetchone()
+  if not row:
+    return None
+  return {ref: clue["text"] for ref, clue in json.loads(row[0]).items()}
+
+
+def _delete_puzzle(connection: sqlite3.Connection, thread_id: int):
+  cursor = connection.cursor()
+  cursor.execute("DELETE FROM crosswords WHERE thread_id = ?", (thread_id,))
+  connection.commit()
+
+
+def _add_subscription(connection: sqlite3.Connection, channel_id: int, guild_id: int, source: str) -> bool:
+  """Returns False if the channel was already subscribed."""
+  cursor = connection.cursor()
+  cursor.execute(
+    "INSERT OR IGNORE INTO subscriptions (channel_id, guild_id, source) VALUES (?, ?, ?)",
+    (channel_id, guild_id, source)
+  )
+  connection.commit()
+  return cursor.rowcount == 1
+
+
+def _remove_subscription(connection: sqlite3.Connection, channel_id: int, source: str) -> bool:
+  """Returns False if the channel wasn't subscribed."""
+  cursor = connection.cursor()
+  cursor.execute("DELETE FROM subscriptions WHERE channel_id = ? AND source = ?", (channel_id, source))
+  connection.commit()
+  return cursor.rowcount == 1
+
+
+def _get_unposted_subscriptions(connection: sqlite3.Connection, puzzle_date: str, source: str) -> list[int]:
+  """Channel ids subscribed to source that don't have a thread for puzzle_date yet."""
+  cursor = connection.cursor()
+  # Answered from the crosswords UNIQUE(channel_id, puzzle_date, source) index
+  cursor.execute("""
+    SELECT
+      s.channel_id
+    FROM
+      subscriptions s
+    WHERE
+      s.source = ? AND NOT EXISTS (
+        SELECT 1 FROM crosswords c
+        WHERE c.channel_id = s.channel_id AND c.puzzle_date = ? AND c.source = s.source
+      )
+    ORDER BY s.channel_id
+    """, (source, puzzle_date))
+  return [row[0] for row in cursor.fetchall()]
+
+
+def _run_once(query, *args):
+  """Runs a query helper on a short-lived connection."""
+  connection = sqlite3.connect(DB_FILE)
+  try:
+    return query(connection, *args)
+  finally:
+    connection.close()
+
+
+def check_puzzle_exists(channel_id: int, puzzle: str, source: str):
+  """Returns the thread_id of the puzzle for this channel, date and source, or None."""
+  return _run_once(_check_puzzle_exists, channel_id, puzzle, source)
+
+
+def create_puzzle(thread_id: int, channel_id: str, puzzle_date: str, source: str, width: int, height: int, grid: Grid, clues_dict: dict):
+  """Inserts a new puzzle record into the database and returns its state."""
+  return _run_once(_create_puzzle, thread_id, channel_id, puzzle_date, source, width, height, grid, clues_dict)
+
+
+def get_puzzle_state(thread_id: int):
+  """Retrieves a puzzle's state from the database and returns it as a Python dictionary."""
+  return _run_once(_get_puzzle_state, thread_id)
+
+
+def update_puzzle_state(thread_id: int, grid: Grid, new_clues: dict, expected_version: int = None):
+  """
+  Rewrites the whole fill state of a puzzle from its grid and clues.
+
+  If expected_version is given the write only happens if the stored row is still at that
+  version. Returns the row's new version, or None if nothing was written.
+  """
+  return _run_once(_update_puzzle_state, thread_id, grid, new_clues, expected_version)
+
+
+def update_puzzle_cells(thread_id: int, state: dict, changed_cells, changed_clues, expected_version: int = None):
+  """
+  Writes the new values of changed_cells and statuses of changed_clues from state,
+  leaving the rest of the stored puzzle untouched.
+
+  If expected_version is given the write only happens if the stored row is still at that
+  version. Returns True and moves state["version"] on if the write happened, otherwise False.
+  """
+  return _run_once(_update_puzzle_cells, thread_id, state, changed_cells, changed_clues, expected_version)
+
+
+def update_puzzle_status(thread_id: int, status: str):
+  """Updates the status column for a specific puzzle."""
+  _run_once(_update_puzzle_status, thread_id, status)
+
+
+def get_previous_clue_texts(source: str, puzzle_date: str):
+  """Returns {clue reference: text} of the latest stored puzzle from source before puzzle_date, or None."""
+  return _run_once(_get_previous_clue_texts, source, puzzle_date)
+
+
+def delete_puzzle(thread_id: int):
+  """Deletes a puzzle record, e.g. when its thread couldn't be set up."""
+  _run_once(_delete_puzzle, thread_id)
+
+
+def add_subscription(channel_id: int, guild_id: int, source: str) -> bool:
+  """Subscribes a channel to a source's daily puzzle. Returns False if it already was."""
+  return _run_once(_add_subscription, channel_id, guild_id, source)
+
+
+def remove_subscription(channel_id: int, source: str) -> bool:
+  """Unsubscribes a channel from a source. Returns False if it wasn't subscribed."""
+  return _run_once(_remove_subscription, channel_id, source)
+
+
+def get_unposted_subscriptions(puzzle_date: str, source: str) -> list[int]:
+  """Returns the subscribed channels still waiting on the puzzle for puzzle_date."""
+  return _run_once(_get_unposted_subscriptions, puzzle_date, source)
+
+
+class AsyncDatabase:
+  """
+  Awaitable versions of the puzzle functions above, sharing one long-lived connection.
+
+  The connection is opened lazily in WAL mode with the PRAGMAS above and lives on a single
+  worker thread, so queries never block the event loop and never need their own connection.
+  Statements are kept compiled in sqlite3's per-connection statement cache.
+  """
+
+  def __init__(self, db_file: str = None):
+    self.db_file = db_file
+    self._connection = None
+    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+  def _connect(self) -> sqlite3.Connection:
+    if self._connection is None:
+      # Looked up here so tests can point DB_FILE somewhere else
+      connection = sqlite3.connect(
+        self.db_file or DB_FILE,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+      )
+      for pragma in PRAGMAS:
+        connection.execute(pragma)
+      self._connection = connection
+    return self._connection
+
+  async def _run(self, query, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self._executor, lambda: query(self._connect(), *args))
+
+  async def check_puzzle_exists(self, channel_id: int, puzzle: str, source: str):
+    return await self._run(_check_puzzle_exists, channel_id, puzzle, source)
+
+  async def create_puzzle(self, thread_id: int, channel_id: str, puzzle_date: str, source: str, width: int, height: int, grid: Grid, clues_dict: dict):
+    return await self._run(_create_puzzle, thread_id, channel_id, puzzle_date, source, width, height, grid, clues_dict)
+
+  async def get_puzzle_state(self, thread_id: int):
+    return await self._run(_get_puzzle_state, thread_id)
+
+  async def update_puzzle_state(self, thread_id: int, grid: Grid, new_clues: dict, expected_version: int = None):
+    return await self._run(_update_puzzle_state, thread_id, grid, new_clues, expected_version)
+
+  async def update_puzzle_cells(self, thread_id: int, state: dict, changed_cells, changed_clues, expected_version: int = None):
+    return await self._run(_update_puzzle_cells, thread_id, state, changed_cells, changed_clues, expected_version)
+
+  async def update_puzzle_status(self, thread_id: int, status: str):
+    await self._run(_update_puzzle_status, thread_id, status)
+
+  async def get_previous_clue_texts(self, source: str, puzzle_date: str):
+    return await self._run(_get_previous_clue_texts, source, puzzle_date)
+
+  async def delete_puzzle(self, thread_id: int):
+    await self._run(_delete_puzzle, thread_id)
+
+  async def add_subscription(self, channel_id: int, guild_id: int, source: str) -> bool:
+    return await self._run(_add_subscription, channel_id, guild_id, source)
+
+  async def remove_subscription(self, channel_id: int, source: str) -> bool:
+    return await self._run(_remove_subscription, channel_id, source)
+
+  async def get_unposted_subscriptions(self, puzzle_date: str, source: str) -> list[int]:
+    return await self._run(_get_unposted_subscriptions, puzzle_date, source)
+
+  def _close(self):
+    if self._connection is not None:
+      self._connection.close()
+      self._connection = None
+
+  async def close(self):
+    """Closes the shared connection. It will be reopened if the database is used again."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(self._executor, self._close)
+
+
+# Shared by the whole bot
+store = AsyncDatabase()
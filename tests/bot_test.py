@@ -0,0 +1,29 @@
+# tests/bot_test.py
+import discord
+from discord.ext import commands
+from bot import CrosswordBot
+
+
+class SavingCog(commands.Cog):
+  def __init__(self):
+    self.saved = False
+
+  async def save_progress(self):
+    self.saved = True
+
+
+class FailingCog(commands.Cog):
+  async def save_progress(self):
+    raise RuntimeError("database is gone")
+
+
+async def test_close_saves_progress_first():
+  bot = CrosswordBot(intents=discord.Intents.default())
+  saving = SavingCog()
+  bot.add_cog(FailingCog())
+  bot.add_cog(saving)
+
+  # The way bot.run shuts down on SIGTERM, without unloading any cogs
+  await bot.close()
+
+  assert saving.saved and bot.is_closed()
@@ -0,0 +1,37 @@
+# tests/conftest.py
+"""Sample puzzle and database fixtures shared by the test modules."""
+import contextlib
+import io
+import pytest
+import database as db
+from cogs.crossword.getMetro import findCellInfo, parsePuzzle
+
+
+@pytest.fixture
+def sample_fragments():
+  """The saved grid, across clue and down clue HTML, as findMetroPuzzleHTML returns them."""
+  fragments = []
+  for name in ("puzzle_grid.html", "across_clues.html", "down_clues.html"):
+    with open(f"tests/samples/{name}", "r") as f:
+      fragments.append(f.read())
+  return tuple(fragments)
+
+
+@pytest.fixture
+def sample_grid(sample_fragments):
+  return findCellInfo(sample_fragments[0])
+
+
+@pytest.fixture
+def sample_puzzle(sample_fragments):
+  """The sample puzzle parsed into (grid, clues), without the warnings about its skipped clues."""
+  with contextlib.redirect_stdout(io.StringIO()):
+    return parsePuzzle(*sample_fragments)
+
+
+@pytest.fixture
+def puzzle_db(tmp_path, monkeypatch):
+  """A fresh bot database in tmp_path, returning its file name."""
+  monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "bot_data.db"))
+  db.setup_database()
+  return db.DB_FILE
@@ -0,0 +1,43 @@
+# tests/crossword/answer_batcher_test.py
+import asyncio
+import pytest
+from cogs.crossword.answer_batcher import AnswerBatcher
+
+
+async def test_burst_is_published_once():
+  published = []
+
+  async def publish(thread_id, burst):
+    published.append((thread_id, burst))
+
+  batcher = AnswerBatcher(publish)
+  batcher.enable(1, 0.05)
+  batcher.add(1, "channel", "@ann", "1A", "SATISFY", [(0, 0), (1, 0)])
+  batcher.add(1, "channel", "@bob", "2D", "STRICT", [(1, 0), (1, 1)])
+  batcher.add(1, "channel", "@ann", "3A", "TEA", [(0, 2)])
+  assert batcher.pending(1) == 3
+
+  await asyncio.sleep(0.1)
+
+  assert len(published) == 1
+  thread_id, burst = published[0]
+  assert thread_id == 1 and burst.channel == "channel"
+  assert burst.cells == {(0, 0), (1, 0), (1, 1), (0, 2)}
+  assert burst.contributors == ["@ann", "@bob"]
+  assert [clue for _, clue, _ in burst.answers] == ["1A", "2D", "3A"]
+  assert batcher.pending(1) == 0
+
+
+async def test_window_is_bounded():
+  async def publish(thread_id, burst):
+    pass
+
+  batcher = AnswerBatcher(publish)
+  with pytest.raises(ValueError):
+    batcher.enable(1, 60)
+  batcher.enable(1, 2)
+  batcher.add(1, "channel", "@ann", "1A", "SATISFY", [(0, 0)])
+  batcher.disable(1)
+  assert not batcher.is_enabled(1)
+  batcher.close()
+  assert batcher.pending(1) == 0
@@ -0,0 +1,104 @@
+# tests/crossword/browser_pool_test.py
+import pytest
+from cogs.crossword import browser_pool
+from cogs.crossword.browser_pool import BrowserPool
+
+
+class FakePage:
+  async def close(self):
+    pass
+
+
+class FakeContext:
+  def __init__(self):
+    self.closed = False
+
+  async def new_page(self):
+    return FakePage()
+
+  async def close(self):
+    self.closed = True
+
+
+class FakeBrowser:
+  def __init__(self):
+    self.connected = True
+    self.contexts = []
+
+  def is_connected(self):
+    return self.connected
+
+  async def new_context(self):
+    context = FakeContext()
+    self.contexts.append(context)
+    return context
+
+  async def close(self):
+    self.connected = False
+
+
+class FakePlaywright:
+  def __init__(self, launches):
+    self.launches = launches
+    self.chromium = self
+
+  async def launch(self):
+    browser = FakeBrowser()
+    self.launches.append(browser)
+    return browser
+
+  async def stop(self):
+    pass
+
+
+@pytest.fixture
+def launches(monkeypatch):
+  launched = []
+
+  class FakeStarter:
+    async def start(self):
+      return FakePlaywright(launched)
+
+  monkeypatch.setattr(browser_pool, "async_playwright", FakeStarter)
+  return launched
+
+
+async def test_browser_is_lazy_and_reused(launches):
+  pool = BrowserPool(max_pages_per_context=10)
+  assert launches == []  # Nothing launched until a page is needed
+
+  for _ in range(3):
+    async with pool.page():
+      pass
+
+  assert len(launches) == 1  # One browser for every fetch
+  assert len(launches[0].contexts) == 1  # And a single reused context
+  await pool.close()
+
+
+async def test_context_recycled_after_max_pages(launches):
+  pool = BrowserPool(max_pages_per_context=2)
+
+  for _ in range(4):
+    async with pool.page():
+      pass
+
+  contexts = launches[0].contexts
+  assert len(contexts) == 2
+  assert all(context.closed for context in contexts)
+  await pool.close()
+
+
+async def test_failed_fetch_discards_context_and_dead_browser_is_relaunched(launches):
+  pool = BrowserPool()
+
+  with pytest.raises(RuntimeError):
+    async with pool.page():
+      raise RuntimeError("navigation failed")
+  assert launches[0].contexts[0].closed  # Context thrown away after an error
+
+  launches[0].connected = False  # Browser crashed
+  async with pool.page():
+    pass
+  assert len(launches) == 2
+  await pool.close()
@@ -1,16 +1,29 @@
 # tests/crossword/cell_info_test.py
-from cogs.crossword.getMetro import findCellInfo
+from cogs.crossword.getMetro import findCellInfo, gridFromRows
 
 def test_get_across_clues_from_html():
     with open("tests/samples/puzzle_grid.html", "r") as f:
         puzzle_html = f.read()
 
     #CELL INFO
-    cell_dic, grid_width = findCellInfo(puzzle_html)
+    grid = findCellInfo(puzzle_html)
 
-    assert grid_width == 13 # Check dimensions of grid are correct
-    assert len(cell_dic) == grid_width*grid_width # Check every cell has data
-    assert cell_dic[(0,0)]["blank"] is False # Check first cell is not blank
-    assert cell_dic[(0, 1)]["blank"] is True  # Check blank cell is blank
-    assert cell_dic[(1, 0)]["clues"] == set() # Check cell correctly has set initialised
+    assert grid.width == grid.height == 13 # Check dimensions of grid are correct
+    assert len(grid) == grid.width*grid.height # Check every cell has data
+    assert grid.is_blank(0, 0) is False # Check first cell is not blank
+    assert grid.is_blank(0, 1) is True  # Check blank cell is blank
+    assert grid.label(1, 0) == "2" # Check labels are read
+    assert grid.letter(1, 0) == "" # Check cells start empty
 
+
+def test_rectangular_and_ragged_rows():
+    rows = [
+        [("1", False), (None, False), ("2", False), (None, False)],
+        [(None, False), (None, True)],
+    ]
+    grid = gridFromRows(rows)
+
+    assert (grid.width, grid.height) == (4, 2)
+    assert grid.label(2, 0) == "2"
+    assert grid.is_blank(1, 1) is True
+    assert grid.is_blank(2, 1) is True and grid.is_blank(3, 1) is True  # Past the end of a short row
@@ -0,0 +1,238 @@
+# tests/crossword/crossword_cog_test.py
+import asyncio
+import contextlib
+import io
+import discord
+import pytest
+import database as db
+from cogs.crossword import crossword_cog
+from cogs.crossword.crossword_cog import CrosswordCog
+from cogs.crossword.draw_crossword import CLUES_IMAGE_FORMAT, GRID_IMAGE_FORMAT, drawClues, drawCrossword, encodeImage
+from cogs.crossword.getMetro import parsePuzzle
+from cogs.crossword.puzzle_cache import PuzzleCache
+from cogs.crossword.sources import METRO_CRYPTIC, MetroSource
+
+PUZZLE_DATE = "2025-01-01"
+
+
+class FakeBot:
+  def __init__(self):
+    self.channels = {}
+
+  def get_channel(self, channel_id):
+    return self.channels.get(channel_id)
+
+  async def fetch_channel(self, channel_id):
+    raise discord.NotFound(FakeResponse(404), "Unknown Channel")
+
+  async def wait_until_ready(self):
+    await asyncio.Event().wait()
+
+
+class FakeThread:
+  def __init__(self, thread_id, upload_error=None):
+    self.id = thread_id
+    self.upload_error = upload_error
+    self.sent = []
+    self.deleted = False
+
+  async def send(self, content=None, files=None):
+    if self.upload_error is not None:
+      raise self.upload_error
+    self.sent.append(content)
+
+  async def delete(self):
+    self.deleted = True
+
+
+class FakeChannel:
+  def __init__(self, channel_id, upload_error=None):
+    self.id = channel_id
+    self.upload_error = upload_error
+    self.threads = []
+
+  async def create_thread(self, **kwargs):
+    thread = FakeThread(self.id * 10 + len(self.threads), self.upload_error)
+    self.threads.append(thread)
+    return thread
+
+
+class FakeResponse:
+  def __init__(self, status):
+    self.status = status
+    self.reason = "error"
+
+
+class PuzzleThread(discord.Thread):
+  """Passes the commands' isinstance check without a connection behind it."""
+
+  def __init__(self, thread_id):
+    self.id = thread_id
+
+
+class FakeFollowup:
+  def __init__(self):
+    self.files = []
+
+  async def send(self, content=None, files=None, ephemeral=False):
+    if files:
+      self.files.append([file.fp.read() for file in files])
+
+
+class FakeContext:
+  def __init__(self, channel):
+    self.channel = channel
+    self.author = type("Author", (), {"mention": "@someone"})()
+    self.followup = FakeFollowup()
+
+  async def defer(self, ephemeral=False):
+    pass
+
+  async def respond(self, content=None, ephemeral=False):
+    pass
+
+
+class PausingExecutor:
+  """Runs jobs inline, holding grid draws until released so answers can land mid-draw."""
+
+  def __init__(self):
+    self.drawing = asyncio.Event()
+    self.release = asyncio.Event()
+
+  async def run(self, fn, *args, **kwargs):
+    if fn is drawCrossword:
+      self.drawing.set()
+      await self.release.wait()
+    return fn(*args, **kwargs)
+
+
+@pytest.fixture
+async def cog(puzzle_db, sample_fragments, monkeypatch):
+  async def load_sample_puzzle(source, puzzle_date, session=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+      return parsePuzzle(*sample_fragments)
+
+  monkeypatch.setattr(db, "store", db.AsyncDatabase())
+  monkeypatch.setattr(crossword_cog, "puzzle_cache", PuzzleCache())
+  cog = CrosswordCog(FakeBot())
+  cog._load_puzzle = load_sample_puzzle
+  render_executor = cog.render_executor
+  yield cog
+  render_executor.shutdown()
+  for loop in (cog.prefetch_puzzle, cog.persist_puzzles, cog.post_subscriptions, cog.export_metrics):
+    loop.cancel()
+  cog.answer_batcher.close()
+  cog.send_queue.close()
+  await db.store.close()
+
+
+async def test_answers_during_a_draw_are_not_lost_from_later_images(cog, sample_grid):
+  cog.render_executor = executor = PausingExecutor()
+  grid = sample_grid
+  first, second = [(x, y) for y in range(grid.height) for x in range(grid.width) if not grid.is_blank(x, y)][:2]
+
+  drawing = asyncio.create_task(cog._render_images(1, grid, {}))
+  await executor.drawing.wait()
+  grid.set_letter(*first, "S")  # Answered while the first image is being drawn
+  executor.release.set()
+  await drawing
+
+  grid.set_letter(*second, "T")
+  grid_png, _ = await cog._render_images(1, grid, {}, [second], [])
+  assert grid_png == encodeImage(drawCrossword(grid), GRID_IMAGE_FORMAT)
+
+
+async def post_to_subscribers(cog, *channels, missing=()):
+  for channel in channels:
+    cog.bot.channels[channel.id] = channel
+    await db.store.add_subscription(channel.id, 1, METRO_CRYPTIC.name)
+  for channel_id in missing:
+    await db.store.add_subscription(channel_id, 1, METRO_CRYPTIC.name)
+  await cog._post_source(METRO_CRYPTIC, PUZZLE_DATE, set(), asyncio.Semaphore(2))
+
+
+async def test_subscribed_threads_are_answered_separately(cog):
+  first, second = FakeChannel(1), FakeChannel(2)
+  await post_to_subscribers(cog, first, second)
+  assert first.threads[0].sent and second.threads[0].sent
+
+  answered = await cog.puzzle_states.get(first.threads[0].id)
+  clue = next(iter(answered["clues"]))
+  cells = answered["clues"][clue]["cells"]
+  cog.puzzle_states.apply(first.threads[0].id, {cell: "A" for cell in cells}, {clue: "solved"})
+
+  other = await cog.puzzle_states.get(second.threads[0].id)
+  assert other["cells"] is not answered["cells"]
+  assert all(other["cells"].letter(*cell) == "" for cell in cells)
+  assert other["clues"][clue]["status"] == "unsolved"
+
+
+async def test_failed_uploads_leave_nothing_behind(cog):
+  failing = FakeChannel(1, upload_error=discord.HTTPException(FakeResponse(400), "error"))
+  with contextlib.redirect_stdout(io.StringIO()):
+    await post_to_subscribers(cog, failing)
+
+  thread = failing.threads[0]
+  assert thread.deleted
+  assert thread.id not in cog.puzzle_states
+  assert await db.store.get_puzzle_state(thread.id) is None
+  # So the next run tries the channel again
+  assert await db.store.get_unposted_subscriptions(PUZZLE_DATE, METRO_CRYPTIC.name) == [failing.id]
+
+
+async def test_only_missing_channels_lose_their_subscription(cog):
+  # The new thread disappearing before the upload isn't the channel going away
+  thread_gone = FakeChannel(1, upload_error=discord.NotFound(FakeResponse(404), "Unknown Channel"))
+  with contextlib.redirect_stdout(io.StringIO()):
+    await post_to_subscribers(cog, thread_gone, missing=[2])
+
+  assert thread_gone.threads[0].deleted
+  assert await db.store.get_unposted_subscriptions(PUZZLE_DATE, METRO_CRYPTIC.name) == [thread_gone.id]
+
+
+async def test_subscription_posting_carries_on_after_errors(cog, monkeypatch):
+  async def fail(*args):
+    raise OSError("disk full")
+
+  monkeypatch.setattr(crossword_cog, "POST_TIME", "00:00")
+  monkeypatch.setattr(cog, "_encode_unanswered", fail)
+  channel = FakeChannel(1)
+  cog.bot.channels[channel.id] = channel
+  await db.store.add_subscription(channel.id, 1, METRO_CRYPTIC.name)
+
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    await cog.post_subscriptions()
+  assert "disk full" in output.getvalue()
+
+
+async def test_batched_answers_show_in_images_posted_before_the_update(cog, sample_puzzle):
+  grid, clues = sample_puzzle
+  state = await db.store.create_puzzle(1, 1, PUZZLE_DATE, METRO_CRYPTIC.name, grid.width, grid.height, grid, clues)
+  cog.puzzle_states.put(state)
+  await cog._render_images(1, state["cells"], state["clues"])  # Posted with the puzzle, and kept to repaint
+  cog.answer_batcher.enable(1, 10)
+
+  # Two clues that don't cross, so the removal leaves the batched answer in place
+  answered = next(iter(state["clues"]))
+  answered_cells = set(state["clues"][answered]["cells"])
+  removed = next(ref for ref, clue in state["clues"].items() if not answered_cells & set(clue["cells"]))
+  ctx = FakeContext(PuzzleThread(1))
+  length = sum(state["clues"][answered]["lengths"])
+  await cog.answer.callback(cog, ctx, answered, "A" * length)
+  await cog.remove.callback(cog, ctx, removed)
+
+  grid_png, clues_png = ctx.followup.files[-1]
+  assert grid_png == encodeImage(drawCrossword(state["cells"]), GRID_IMAGE_FORMAT)
+  assert clues_png == encodeImage(drawClues(state["clues"]), CLUES_IMAGE_FORMAT)
+
+
+async def test_yesterdays_puzzle_is_not_taken_for_todays_after_a_restart(cog, sample_fragments, sample_puzzle):
+  grid, clues = sample_puzzle
+  await db.store.create_puzzle(1, 1, "2024-12-31", METRO_CRYPTIC.name, grid.width, grid.height, grid, clues)
+
+  # The site still shows the puzzle stored yesterday, and the fresh cache knows nothing about it
+  source = MetroSource(METRO_CRYPTIC.name, METRO_CRYPTIC.title, METRO_CRYPTIC.url)
+  source.fetch = lambda pool=None, session=None: asyncio.sleep(0, sample_fragments)
+  with contextlib.redirect_stdout(io.StringIO()), pytest.raises(RuntimeError, match="hasn't been published"):
+    await CrosswordCog._load_puzzle(cog, source, PUZZLE_DATE)
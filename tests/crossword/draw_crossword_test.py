@@ -0,0 +1,129 @@
+# tests/crossword/draw_crossword_test.py
+import io
+import random
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from cogs.crossword.draw_crossword import (
+  CELL_SIZE, MAX_GRID_IMAGE_SIZE, MIN_CELL_SIZE, ClueRenderer, GridRenderer, drawClues, drawCrossword, encodeImage,
+  getRenderContext, gridCellSize
+)
+from cogs.crossword.grid import Grid
+
+
+def draw_clues_directly(clues):
+  """The clue sheet drawn text by text, the way it was before lines were cached."""
+  font = getRenderContext().clue_font
+  across = [(ref, clue) for ref, clue in clues.items() if clue["direction"] == "A"]
+  down = [(ref, clue) for ref, clue in clues.items() if clue["direction"] == "D"]
+  img = Image.new("RGB", (1300, 100 + max(len(across), len(down)) * 30), color="white")
+  draw = ImageDraw.Draw(img)
+  draw.text((50, 50), "Across", fill="black", font=font)
+  draw.text((650, 50), "Down", fill="black", font=font)
+  for x, column in ((50, across), (650, down)):
+    for row, (ref, clue) in enumerate(column):
+      y, text = 80 + row * 30, f"{clue['num']}. {clue['text']}"
+      if clue["status"] == "solved":
+        draw.text((x, y), text, fill="gray", font=font)
+        bbox = draw.textbbox((0, 0), text, font=font)
+        middle = y + (bbox[3] - bbox[1]) // 2
+        draw.line([(x, middle), (x + bbox[2] - bbox[0], middle)], fill="red", width=2)
+      else:
+        draw.text((x, y), text, fill="black", font=font)
+  return img
+
+
+def test_draw_crossword_uses_shared_tiles(sample_grid):
+  grid = sample_grid
+  grid.set_letter(0, 0, "S")
+
+  image = drawCrossword(grid)
+
+  assert image.size == (grid.width * CELL_SIZE, grid.height * CELL_SIZE)
+  assert image.getpixel((CELL_SIZE // 2, CELL_SIZE + CELL_SIZE // 2)) == (0, 0, 0)  # (0, 1) is blank
+  context = getRenderContext()
+  first_cell = image.crop((0, 0, CELL_SIZE, CELL_SIZE))
+  assert first_cell.tobytes() == context.tile(False, grid.label(0, 0), "S").tobytes()
+  assert getRenderContext() is context  # Fonts and tiles are only built once
+
+
+def test_grid_renderer_matches_full_render(sample_grid):
+  grid = sample_grid
+  renderer = GridRenderer(grid)
+  open_cells = [(x, y) for x, y in grid.coords() if not grid.is_blank(x, y)]
+  rng = random.Random(1)
+
+  for step in range(30):
+    changed = rng.sample(open_cells, 5)
+    for x, y in changed:
+      grid.set_letter(x, y, "" if step % 4 == 3 else rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    image = renderer.update(grid, changed)
+
+    assert image.tobytes() == drawCrossword(grid).tobytes()
+
+
+def test_clue_renderer_matches_full_render(sample_puzzle):
+  _, clues = sample_puzzle
+  renderer = ClueRenderer(clues)
+  refs = list(clues)
+  rng = random.Random(2)
+
+  for step in range(20):
+    changed = rng.sample(refs, 2)
+    for ref in changed:
+      clues[ref]["status"] = "unsolved" if step % 3 == 2 else "solved"
+    image = renderer.update(clues, changed)
+
+    assert image.tobytes() == drawClues(clues).tobytes() == draw_clues_directly(clues).tobytes()
+
+
+def test_clue_renderer_redraws_when_a_line_overflows(sample_puzzle):
+  _, clues = sample_puzzle
+  first = next(iter(clues))
+  clues[first]["text"] = "A clue so long it runs on past the end of the across column " * 2 + "(5)"
+  renderer = ClueRenderer(clues)
+
+  clues[first]["status"] = "solved"
+  assert renderer.update(clues, [first]).tobytes() == draw_clues_directly(clues).tobytes()
+
+
+def test_compact_formats(sample_puzzle):
+  grid, clues = sample_puzzle
+  grid.set_letter(0, 0, "S")
+  grid_image = drawCrossword(grid)
+
+  # The grid has no color in it, so grayscale loses nothing
+  gray = Image.open(io.BytesIO(encodeImage(grid_image, "gray"))).convert("RGB")
+  assert ImageChops.difference(gray, grid_image).getbbox() is None
+  assert len(encodeImage(grid_image, "gray")) < len(encodeImage(grid_image, "png"))
+
+  clues[next(iter(clues))]["status"] = "solved"
+  clues_image = drawClues(clues)
+  palette = Image.open(io.BytesIO(encodeImage(clues_image, "palette")))
+  assert palette.mode == "P" and palette.size == clues_image.size
+  assert len(encodeImage(clues_image, "palette")) < len(encodeImage(clues_image, "png"))
+
+  assert Image.open(io.BytesIO(encodeImage(grid_image, "webp"))).format == "WEBP"
+  with pytest.raises(ValueError):
+    encodeImage(grid_image, "gif")
+
+
+def test_rectangular_and_large_grids():
+  wide = Grid(21, 11)
+  wide.set_blank(20, 10, True)
+  wide.set_letter(0, 0, "W")
+  image = drawCrossword(wide)
+  assert gridCellSize(wide) == CELL_SIZE
+  assert image.size == (21 * CELL_SIZE, 11 * CELL_SIZE)
+  assert image.getpixel((20 * CELL_SIZE + CELL_SIZE // 2, 10 * CELL_SIZE + CELL_SIZE // 2)) == (0, 0, 0)
+
+  # Cells shrink to keep big grids inside MAX_GRID_IMAGE_SIZE, until they reach MIN_CELL_SIZE
+  large = Grid(41, 27)
+  cell_size = gridCellSize(large)
+  assert cell_size < CELL_SIZE
+  assert drawCrossword(large).size == (41 * cell_size, 27 * cell_size)
+  assert max(drawCrossword(large).size) <= MAX_GRID_IMAGE_SIZE
+  assert gridCellSize(Grid(500, 3)) == MIN_CELL_SIZE
+
+  renderer = GridRenderer(large)
+  large.set_letter(40, 26, "Z")
+  assert renderer.update(large, [(40, 26)]).tobytes() == drawCrossword(large).tobytes()
@@ -0,0 +1,53 @@
+# tests/crossword/grid_test.py
+import copy
+import pytest
+from cogs.crossword.grid import Grid, index_clues
+
+
+def test_letters_and_completion(sample_grid):
+  grid = sample_grid
+  open_cells = [(x, y) for x, y in grid.coords() if not grid.is_blank(x, y)]
+
+  for x, y in open_cells:
+    grid.set_letter(x, y, "a")
+  assert grid.letter(*open_cells[0]) == "A"
+  assert grid.is_complete()
+
+  grid.set_letter(*open_cells[-1], "")
+  assert not grid.is_complete()
+
+  with pytest.raises(ValueError):
+    grid.set_letter(*open_cells[0], "1")
+
+
+def test_layout_and_fill_round_trip(sample_grid):
+  grid = sample_grid
+  grid.set_letter(0, 0, "S")
+
+  restored = Grid.from_layout(grid.layout(), grid.fill)
+
+  assert restored == grid
+  assert restored.find_label(2) == (1, 0)
+  assert grid.fill[0] == "S" and grid.fill[13] == "#"
+
+
+def test_copies_are_independent(sample_grid):
+  grid = sample_grid
+  copied = copy.deepcopy(grid)
+  copied.set_letter(0, 0, "S")
+  assert grid.letter(0, 0) == ""
+
+
+def test_clue_indexes_match_a_grid_scan(sample_puzzle):
+  grid, clues = sample_puzzle
+
+  for label, position in grid.label_positions().items():
+    assert grid.find_label(label) == position
+
+  assert clues["1A"]["cells"] == [(x, 0) for x in range(6)]
+  assert clues["2D"]["cells"] == [(1, y) for y in range(13)]
+
+  cell_clues = index_clues(clues)
+  assert sorted(cell_clues[(1, 0)]) == ["1A", "2D"]
+  for ref, clue in clues.items():
+    assert all(ref in cell_clues[cell] for cell in clue["cells"])
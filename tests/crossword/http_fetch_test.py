@@ -0,0 +1,73 @@
+# tests/crossword/http_fetch_test.py
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from cogs.crossword import getMetro
+from cogs.crossword.getMetro import fetchMetroPuzzleHTTP, fetchPuzzleFragments
+
+
+@pytest.fixture
+async def metro_stand_in(sample_fragments):
+  """Local stand-in for the Metro site built from the saved samples."""
+  puzzle_html, across_html, down_html = sample_fragments
+
+  async def puzzle_page(request):
+    return web.Response(content_type="text/html", text=(
+      "<html><body>"
+      f'<div id="puzzle-grid">{puzzle_html}</div>'
+      f'<div class="clue-list clue-list-across">{across_html}</div>'
+      f'<div class="clue-list clue-list-down">{down_html}</div>'
+      "</body></html>"
+    ))
+
+  async def script_only_page(request):
+    return web.Response(content_type="text/html", text='<html><body><div id="puzzle-grid"></div></body></html>')
+
+  app = web.Application()
+  app.router.add_get("/puzzle", puzzle_page)
+  app.router.add_get("/script-only", script_only_page)
+
+  server = TestServer(app)
+  await server.start_server()
+  yield server
+  await server.close()
+
+
+async def test_http_fetch_extracts_fragments(metro_stand_in):
+  puzzle_html, across_html, down_html = await fetchMetroPuzzleHTTP(str(metro_stand_in.make_url("/puzzle")))
+
+  grid = getMetro.findCellInfo(puzzle_html)
+  assert grid.width == 13
+  assert getMetro.getClues(across_html, "A")[0] == ('1', 'Settled little dog, maintaining support (4,2)', 'A')
+  assert getMetro.getClues(down_html, "D")[0] == ('2', 'Strict writer in tiara again (13)', 'D')
+
+
+async def test_falls_back_to_playwright_when_page_has_no_puzzle(metro_stand_in, monkeypatch):
+  calls = []
+
+  async def fake_playwright_fetch(url, pool=None):
+    calls.append(url)
+    return "grid", "across", "down"
+
+  monkeypatch.setattr(getMetro, "findMetroPuzzleHTML", fake_playwright_fetch)
+
+  url = str(metro_stand_in.make_url("/script-only"))
+  assert await fetchPuzzleFragments(url) == ("grid", "across", "down")
+  assert calls == [url]
+
+  # And the browser is left alone when the fast path works
+  await fetchPuzzleFragments(str(metro_stand_in.make_url("/puzzle")))
+  assert len(calls) == 1
+
+
+async def test_falls_back_to_playwright_when_the_page_times_out(monkeypatch):
+  async def slow_http_fetch(url, session=None):
+    raise asyncio.TimeoutError()
+
+  async def fake_playwright_fetch(url, pool=None):
+    return "grid", "across", "down"
+
+  monkeypatch.setattr(getMetro, "fetchMetroPuzzleHTTP", slow_http_fetch)
+  monkeypatch.setattr(getMetro, "findMetroPuzzleHTML", fake_playwright_fetch)
+  assert await fetchPuzzleFragments("https://example.com") == ("grid", "across", "down")
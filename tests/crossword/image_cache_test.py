@@ -0,0 +1,60 @@
+# tests/crossword/image_cache_test.py
+from cogs.crossword.image_cache import ImageCache, clues_image_key, grid_image_key
+
+
+def test_keys_follow_what_is_drawn(sample_grid):
+  grid = sample_grid
+  key = grid_image_key(grid)
+  assert grid_image_key(grid.copy()) == key
+
+  grid.set_letter(0, 0, "S")
+  assert grid_image_key(grid) != key
+  grid.set_letter(0, 0, "")
+  assert grid_image_key(grid) == key  # Back to the same picture
+
+  clues = {"1A": {"num": "1", "text": "Settled little dog (4,2)", "direction": "A", "status": "unsolved"}}
+  unsolved = clues_image_key(clues)
+  clues["1A"]["status"] = "solved"
+  assert clues_image_key(clues) != unsolved
+
+
+async def test_least_recently_used_images_are_dropped():
+  cache = ImageCache(max_bytes=10)
+  cache.put("a", b"aaaa")
+  cache.put("b", b"bbbb")
+  assert await cache.get("a") == b"aaaa"
+  cache.put("c", b"cccc")
+
+  assert "b" not in cache
+  assert await cache.get("b") is None
+  assert cache.size == 8
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+async def test_dropped_images_spill_to_disk(tmp_path):
+  cache = ImageCache(max_bytes=10, spill_dir=str(tmp_path), max_spill_bytes=8)
+  for key in "abcd":
+    cache.put(key, key.encode() * 4)
+
+  assert "a" not in cache and "b" not in cache
+  assert await cache.get("b") == b"bbbb"  # Read back from disk
+  assert "b" in cache
+  assert await cache.get("z") is None
+
+  cache.put("e", b"eeee")
+  cache.put("f", b"ffff")
+  cache.close()
+  spilled = sorted(path.name for path in tmp_path.iterdir())
+  assert len(spilled) == 2  # Oldest files were pruned to stay under max_spill_bytes
+  assert cache.spill_size == 8
+
+
+async def test_spilled_images_outlive_a_restart(tmp_path):
+  cache = ImageCache(max_bytes=4, spill_dir=str(tmp_path))
+  cache.put("a", b"aaaa")
+  cache.put("b", b"bbbb")
+  cache.close()
+
+  restarted = ImageCache(max_bytes=4, spill_dir=str(tmp_path))
+  assert await restarted.get("a") == b"aaaa"
+  restarted.close()
@@ -0,0 +1,15 @@
+# tests/crossword/lazy_imports_test.py
+import subprocess
+import sys
+
+# Only needed once a puzzle is fetched, drawn or profiled, so loading the cog mustn't import them
+HEAVY_MODULES = ("PIL", "bs4", "lxml", "playwright", "cProfile", "tracemalloc")
+
+
+def test_loading_the_cog_skips_heavy_modules():
+  code = (
+    "import sys; import cogs.crossword.crossword_cog; "
+    f"print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+  )
+  output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+  assert output.split() == []
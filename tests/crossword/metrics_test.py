@@ -0,0 +1,35 @@
+# tests/crossword/metrics_test.py
+import asyncio
+from cogs.crossword.metrics import Metrics
+
+
+async def test_spans_are_recorded_into_histograms():
+  metrics = Metrics()
+  for _ in range(3):
+    with metrics.span("render.grid"):
+      await asyncio.sleep(0.002)
+  metrics.observe("upload", 120)
+  metrics.increment("clues_skipped", 2)
+
+  render = metrics.histograms["render.grid"]
+  assert render.count == 3
+  assert 2 <= render.percentile(0.5) <= render.max
+  assert metrics.histograms["upload"].percentile(0.99) == 120  # Capped at the slowest seen
+
+  table = metrics.format_table()
+  assert "render.grid" in table and "clues_skipped" in table
+
+
+def test_prometheus_text_file(tmp_path):
+  metrics = Metrics()
+  metrics.observe("parse", 3)
+  metrics.observe("parse", 40)
+  metrics.set_gauge("send_queue.depth", 3)
+  path = tmp_path / "crossword.prom"
+  metrics.write_prometheus(str(path))
+
+  text = path.read_text()
+  assert 'crossword_span_milliseconds_bucket{span="parse",le="5"} 1' in text
+  assert 'crossword_span_milliseconds_bucket{span="parse",le="+Inf"} 2' in text
+  assert 'crossword_span_milliseconds_count{span="parse"} 2' in text
+  assert 'crossword_gauge{name="send_queue.depth"} 3' in text
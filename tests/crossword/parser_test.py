@@ -0,0 +1,20 @@
+# tests/crossword/parser_test.py
+import pytest
+from cogs.crossword import getMetro
+
+
+def test_lxml_matches_beautifulsoup(sample_fragments):
+  puzzle_html, across_html, down_html = sample_fragments
+
+  grid, across, down = getMetro.parseFragmentsLxml(puzzle_html, across_html, down_html)
+  assert grid == getMetro.findCellInfo(puzzle_html)
+  assert across == getMetro.getClues(across_html, "A")
+  assert down == getMetro.getClues(down_html, "D")
+
+  assert getMetro.parsePuzzle(puzzle_html, across_html, down_html, parser="lxml") == \
+    getMetro.parsePuzzle(puzzle_html, across_html, down_html, parser="html.parser")
+
+
+def test_unknown_parser():
+  with pytest.raises(ValueError):
+    getMetro.parsePuzzle("", "", "", parser="regex")
@@ -0,0 +1,41 @@
+# tests/crossword/profiling_test.py
+import pstats
+from pathlib import Path
+from cogs.crossword.draw_crossword import drawCrossword
+from cogs.crossword.profiling import CommandProfiler
+from cogs.crossword.render_executor import RenderExecutor
+
+
+async def test_profile_includes_render_jobs(tmp_path, sample_grid):
+  profiler = CommandProfiler(str(tmp_path), sample_rate=1, keep=5)
+  executor = RenderExecutor("thread", 1, 1)
+  executor.job_wrapper = profiler.wrap
+
+  session = profiler.start("answer")
+  assert profiler.start("remove") is None  # One at a time
+  await executor.run(drawCrossword, sample_grid)
+  path = profiler.stop(session)
+  executor.shutdown()
+
+  functions = {name for _, _, name in pstats.Stats(path).stats}
+  assert "drawCrossword" in functions
+  assert Path(path.replace(".prof", ".mem.txt")).read_text().startswith("peak traced memory")
+
+
+def test_old_dumps_are_rotated(tmp_path, monkeypatch):
+  profiler = CommandProfiler(str(tmp_path), sample_rate=1, keep=2)
+  clock = iter(range(1_700_000_000, 1_700_000_100))
+  monkeypatch.setattr("cogs.crossword.profiling.time.time", lambda: next(clock))
+
+  for _ in range(4):
+    profiler.stop(profiler.start("answer"))
+
+  assert len(list(tmp_path.glob("answer-*.prof"))) == 2
+  assert len(list(tmp_path.glob("answer-*.mem.txt"))) == 2
+
+
+def test_off_without_a_directory():
+  profiler = CommandProfiler(None, sample_rate=1)
+  assert not profiler.enabled
+  assert profiler.start("answer") is None
+  assert profiler.wrap(len) is len
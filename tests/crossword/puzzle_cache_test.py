@@ -0,0 +1,40 @@
+# tests/crossword/puzzle_cache_test.py
+import asyncio
+from cogs.crossword.puzzle_cache import PuzzleCache
+
+
+async def test_concurrent_requests_share_one_fetch(sample_puzzle):
+  cache = PuzzleCache()
+  fetches = 0
+
+  async def fetch():
+    nonlocal fetches
+    fetches += 1
+    await asyncio.sleep(0.01)
+    return sample_puzzle
+
+  results = await asyncio.gather(*(cache.get_or_fetch("metrocryptic", "2025-01-01", fetch) for _ in range(5)))
+
+  assert fetches == 1
+  assert all(result[0].width == 13 for result in results)
+
+
+async def test_callers_get_private_copies(sample_puzzle):
+  cache = PuzzleCache()
+  grid, clues = await cache.get_or_fetch("metrocryptic", "2025-01-01", lambda: asyncio.sleep(0, sample_puzzle))
+
+  grid.set_letter(0, 0, "A")
+  clues["1A"]["status"] = "solved"
+
+  cached_grid, cached_clues = cache.get("metrocryptic", "2025-01-01")
+  assert cached_grid.letter(0, 0) == ""
+  assert cached_clues["1A"]["status"] == "unsolved"
+
+
+def test_oldest_puzzles_are_dropped():
+  cache = PuzzleCache(max_entries=2)
+  for day in ("2025-01-01", "2025-01-02", "2025-01-03"):
+    cache.put("metrocryptic", day, ({}, {}))
+
+  assert ("metrocryptic", "2025-01-01") not in cache
+  assert ("metrocryptic", "2025-01-03") in cache
@@ -0,0 +1,42 @@
+# tests/crossword/render_executor_test.py
+import asyncio
+import threading
+import time
+import pytest
+from PIL import Image
+from cogs.crossword.draw_crossword import encodePNG
+from cogs.crossword.render_executor import RenderExecutor
+
+
+async def test_jobs_run_off_the_event_loop():
+  executor = RenderExecutor(mode="thread", workers=2)
+  loop_thread = threading.get_ident()
+
+  png = await executor.run(encodePNG, Image.new("RGB", (40, 40), color="white"))
+  worker_thread = await executor.run(threading.get_ident)
+
+  assert png.startswith(b"\x89PNG")
+  assert worker_thread != loop_thread
+  executor.shutdown()
+
+
+async def test_queue_is_bounded():
+  executor = RenderExecutor(mode="thread", workers=1, max_queued=2)
+  peak = 0
+
+  async def submit():
+    nonlocal peak
+    job = asyncio.ensure_future(executor.run(time.sleep, 0.01))
+    await asyncio.sleep(0)
+    peak = max(peak, executor.in_flight)
+    await job
+
+  await asyncio.gather(*(submit() for _ in range(10)))
+
+  assert peak == 3  # One running plus two queued, the rest wait on the loop
+  executor.shutdown()
+
+
+def test_unknown_mode_is_rejected():
+  with pytest.raises(ValueError):
+    RenderExecutor(mode="gpu")
@@ -0,0 +1,88 @@
+# tests/crossword/send_queue_test.py
+import asyncio
+import discord
+import pytest
+from cogs.crossword.metrics import metrics
+from cogs.crossword.send_queue import PRIORITY_FOLLOWUP, PRIORITY_INFO, SendQueue, retry_delay
+
+
+class FakeResponse:
+  def __init__(self, status, headers=None):
+    self.status = status
+    self.reason = "error"
+    self.headers = headers or {}
+
+
+def http_error(status, headers=None):
+  return discord.HTTPException(FakeResponse(status, headers), "error")
+
+
+async def test_sends_go_out_in_priority_order():
+  queue = SendQueue()
+  sent = []
+  release = asyncio.Event()
+
+  async def first():
+    await release.wait()
+    sent.append("first")
+
+  def message(name):
+    async def send():
+      sent.append(name)
+      return name
+    return send
+
+  # The first send holds the channel while the rest queue up behind it
+  tasks = [asyncio.create_task(queue.send(1, first))]
+  await asyncio.sleep(0)
+  tasks.append(asyncio.create_task(queue.send(1, message("complete"), PRIORITY_INFO)))
+  tasks.append(asyncio.create_task(queue.send(1, message("update"))))
+  tasks.append(asyncio.create_task(queue.send(1, message("followup"), PRIORITY_FOLLOWUP)))
+  await asyncio.sleep(0)
+  assert queue.depth(1) == 3 and metrics.gauges["send_queue.depth"] == 3
+
+  release.set()
+  results = await asyncio.gather(*tasks)
+
+  assert sent == ["first", "followup", "update", "complete"]
+  assert results[1:] == ["complete", "update", "followup"]
+  assert queue.depth() == 0 and len(queue) == 0
+
+
+async def test_rate_limited_sends_are_retried():
+  delays = []
+
+  async def sleep(seconds):
+    delays.append(seconds)
+
+  queue = SendQueue(max_attempts=3, sleep=sleep)
+  attempts = []
+
+  async def send():
+    attempts.append(1)
+    if len(attempts) < 3:
+      raise http_error(429, {"Retry-After": "2.5"})
+    return "sent"
+
+  assert await queue.send(1, send) == "sent"
+  assert len(attempts) == 3
+  assert delays[0] == 2.5  # Discord asked for longer than the backoff
+
+  # Out of attempts, and errors that a retry won't fix, go back to the caller
+  delays.clear()
+  with pytest.raises(discord.HTTPException):
+    await queue.send(1, lambda: _raise(http_error(429)))
+  assert len(delays) == 2
+  with pytest.raises(discord.Forbidden):
+    await queue.send(2, lambda: _raise(discord.Forbidden(FakeResponse(403), "error")))
+  assert len(delays) == 2
+
+
+async def _raise(error):
+  raise error
+
+
+def test_retry_delay():
+  assert retry_delay(http_error(404), 0) is None
+  assert 0.5 <= retry_delay(http_error(503), 0) <= 1
+  assert retry_delay(http_error(429), 10) <= 30
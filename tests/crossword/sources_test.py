@@ -0,0 +1,62 @@
+# tests/crossword/sources_test.py
+import asyncio
+import contextlib
+import io
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from cogs.crossword.sources import METRO_CRYPTIC, SOURCES, MetroSource, get_source, register_source
+
+
+@pytest.fixture
+async def paired_metro_pages(sample_fragments):
+  """Two Metro style puzzle pages that only come back once both have been asked for."""
+  puzzle_html, across_html, down_html = sample_fragments
+  page = (
+    "<html><body>"
+    f'<div id="puzzle-grid">{puzzle_html}</div>'
+    f'<div class="clue-list clue-list-across">{across_html}</div>'
+    f'<div class="clue-list clue-list-down">{down_html}</div>'
+    "</body></html>"
+  )
+
+  both_requested = asyncio.Event()
+  requested = []
+
+  async def puzzle_page(request):
+    requested.append(request.path)
+    if len(requested) == 2:
+      both_requested.set()
+    # Fetched one after the other, the first request would time out here
+    await asyncio.wait_for(both_requested.wait(), timeout=5)
+    return web.Response(content_type="text/html", text=page)
+
+  app = web.Application()
+  app.router.add_get("/cryptic", puzzle_page)
+  app.router.add_get("/quick", puzzle_page)
+  server = TestServer(app)
+  await server.start_server()
+  yield server
+  await server.close()
+
+
+def test_registered_sources():
+  assert get_source("metrocryptic") is METRO_CRYPTIC
+  assert "metroquick" in SOURCES
+  with pytest.raises(ValueError):
+    register_source(MetroSource("metrocryptic", "Another Cryptic", "https://example.com"))
+
+
+async def test_sources_fetch_concurrently_into_the_same_parser(paired_metro_pages):
+  sources = [
+    MetroSource("cryptic", "Cryptic", str(paired_metro_pages.make_url("/cryptic"))),
+    MetroSource("quick", "Quick", str(paired_metro_pages.make_url("/quick"))),
+  ]
+
+  async with aiohttp.ClientSession() as session:
+    results = await asyncio.gather(*(source.fetch(session=session) for source in sources))
+
+  with contextlib.redirect_stdout(io.StringIO()):
+    grids = [source.parse(fragments)[0] for source, fragments in zip(sources, results)]
+  assert all(grid.width == 13 for grid in grids)
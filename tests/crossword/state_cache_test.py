@@ -0,0 +1,122 @@
+# tests/crossword/state_cache_test.py
+import asyncio
+import pytest
+import database as db
+from cogs.crossword.state_cache import PuzzleStateCache
+
+
+@pytest.fixture
+async def store(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+  clues = {"1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": "", "num": "1"}}
+  for thread_id in (1, 2, 3):
+    await store.create_puzzle(thread_id, thread_id, "2025-01-01", "metrocryptic", grid.width, grid.height, grid.copy(), clues)
+
+  yield store
+  await store.close()
+
+
+async def test_reads_are_served_from_memory(store, monkeypatch):
+  cache = PuzzleStateCache(store)
+  state = await cache.get(1)
+
+  async def fail(thread_id):
+    raise AssertionError("should not hit the database")
+
+  monkeypatch.setattr(store, "get_puzzle_state", fail)
+  assert await cache.get(1) is state
+  assert await cache.get(1) is state
+
+
+async def test_changes_are_written_behind(store):
+  cache = PuzzleStateCache(store)
+  state = await cache.get(1)
+  state["cells"].set_letter(0, 0, "S")
+  state["clues"]["1A"]["status"] = "solved"
+  cache.mark_dirty(1, [(0, 0)], ["1A"])
+
+  assert (await store.get_puzzle_state(1))["cells"].letter(0, 0) == ""  # Not written yet
+
+  await cache.flush()
+  stored = await store.get_puzzle_state(1)
+  assert stored["cells"].letter(0, 0) == "S"
+  assert stored["clues"]["1A"]["status"] == "solved"
+
+
+async def test_eviction_keeps_unsaved_puzzles(store):
+  cache = PuzzleStateCache(store, max_entries=1)
+  for thread_id in (1, 2, 3):
+    state = await cache.get(thread_id)
+  state["cells"].set_letter(0, 0, "S")
+  cache.mark_dirty(3, [(0, 0)])
+
+  cache.evict()
+  assert len(cache) == 1 and 3 in cache
+
+  cache.max_entries = 0
+  cache.evict()
+  assert 3 in cache  # Still dirty
+
+  cache.flush_sync()
+  cache.evict()
+  assert len(cache) == 0
+  assert (await store.get_puzzle_state(3))["cells"].letter(0, 0) == "S"
+
+
+async def test_applied_changes_are_queued_for_writing(store):
+  cache = PuzzleStateCache(store)
+  await cache.get(1)
+
+  cache.apply(1, {(0, 0): "S"}, {"1A": "solved"})
+  state = await cache.get(1)
+  assert state["cells"].letter(0, 0) == "S" and state["clues"]["1A"]["status"] == "solved"
+
+  await cache.flush()
+  assert (await store.get_puzzle_state(1))["clues"]["1A"]["status"] == "solved"
+
+
+async def test_flush_merges_changes_made_elsewhere(store):
+  reconciled = []
+  cache = PuzzleStateCache(store)
+  cache.on_reconcile = reconciled.append
+  await cache.get(1)
+
+  # Another process answers while we hold the puzzle in memory
+  other = await store.get_puzzle_state(1)
+  other["cells"].set_letter(1, 0, "A")
+  assert await store.update_puzzle_cells(1, other, [(1, 0)], [], expected_version=other["version"])
+
+  cache.apply(1, {(0, 0): "S"}, {"1A": "solved"})
+  await cache.flush()
+
+  assert reconciled == [1]
+  for state in (await cache.get(1), await store.get_puzzle_state(1)):
+    assert state["cells"].letter(0, 0) == "S"
+    assert state["cells"].letter(1, 0) == "A"
+    assert state["clues"]["1A"]["status"] == "solved"
+    assert state["version"] == 2
+
+
+async def test_cancelled_flush_keeps_changes_for_shutdown(store, monkeypatch):
+  cache = PuzzleStateCache(store)
+  state = await cache.get(1)
+  state["cells"].set_letter(0, 0, "S")
+  cache.mark_dirty(1, [(0, 0)])
+
+  started = asyncio.Event()
+
+  async def hang(*args, **kwargs):
+    started.set()
+    await asyncio.Event().wait()
+
+  monkeypatch.setattr(store, "update_puzzle_cells", hang)
+  flush = asyncio.create_task(cache.flush())
+  await started.wait()
+  flush.cancel()
+  with pytest.raises(asyncio.CancelledError):
+    await flush
+
+  # Still there for the blocking write at shutdown
+  cache.flush_sync()
+  assert (await store.get_puzzle_state(1))["cells"].letter(0, 0) == "S"
@@ -0,0 +1,145 @@
+# tests/database_test.py
+import database as db
+
+
+async def test_async_round_trip(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+  clues = {"1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": "", "num": "1"}}
+
+  await store.create_puzzle(123, 456, "2025-01-01", "metrocryptic", grid.width, grid.height, grid, clues)
+  assert await store.check_puzzle_exists(456, "2025-01-01", "metrocryptic") == 123
+
+  state = await store.get_puzzle_state(123)
+  state["cells"].set_letter(0, 0, "S")
+  state["clues"]["1A"]["status"] = "solved"
+  await store.update_puzzle_state(123, state["cells"], state["clues"])
+  await store.update_puzzle_status(123, "completed")
+
+  # Visible to a separate, synchronous connection as well
+  state = db.get_puzzle_state(123)
+  assert state["cells"].letter(0, 0) == "S"
+  assert state["cells"].label(1, 0) == "2"
+  assert state["clues"]["1A"]["status"] == "solved"
+  assert state["status"] == "completed"
+  await store.close()
+
+
+async def test_connection_is_reused_in_wal_mode(puzzle_db):
+  store = db.AsyncDatabase()
+  await store.get_puzzle_state(1)
+  connection = store._connection
+
+  await store.check_puzzle_exists(1, "2025-01-01", "metrocryptic")
+
+  assert store._connection is connection
+  assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+  await store.close()
+
+
+async def test_cell_updates_only_touch_changed_cells(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+  clues = {
+    "1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": "", "num": "1"},
+    "2D": {"start": [1, 0], "lengths": [13], "status": "unsolved", "direction": "D", "text": "", "num": "2"},
+  }
+  await store.create_puzzle(123, 456, "2025-01-01", "metrocryptic", grid.width, grid.height, grid, clues)
+
+  state = await store.get_puzzle_state(123)
+  changed = [(x, 0) for x in range(6)]
+  for (x, y), letter in zip(changed, "SATISFY"):
+    state["cells"].set_letter(x, y, letter)
+  state["clues"]["1A"]["status"] = "solved"
+  await store.update_puzzle_cells(123, state, changed, ["1A"])
+
+  stored = await store.get_puzzle_state(123)
+  assert "".join(stored["cells"].letter(x, 0) for x in range(6)) == "SATISF"
+  assert stored["cells"].letter(6, 0) == ""
+  assert stored["clues"]["1A"]["status"] == "solved"
+  assert stored["clues"]["2D"]["status"] == "unsolved"
+  await store.close()
+
+
+def test_rows_from_before_packing_are_migrated(puzzle_db):
+  import json
+  import sqlite3
+  connection = sqlite3.connect(puzzle_db)
+  connection.execute(
+    "INSERT INTO crosswords (thread_id, channel_id, puzzle_date, source, status, width, height, cells_json, clues_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    (1, 2, "2025-01-01", "metrocryptic", "running", 2, 1,
+     json.dumps({"0,0": {"blank": False, "label": "1", "value": "A", "clues": []},
+                 "1,0": {"blank": True, "label": None, "value": "", "clues": []}}),
+     json.dumps({"1A": {"start": [0, 0], "lengths": [1], "status": "solved", "direction": "A", "text": "", "num": "1"}}))
+  )
+  connection.commit()
+
+  state = db.get_puzzle_state(1)
+  assert state["cells"].letter(0, 0) == "A"
+  assert connection.execute("SELECT fill, solved FROM crosswords").fetchone() == ("A#", "1")
+  assert state["clues"]["1A"]["cells"] == [(0, 0)]
+  assert state["cell_clues"] == {(0, 0): ["1A"]}
+  connection.close()
+
+
+async def test_stale_versions_are_rejected(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+  clues = {"1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": "", "num": "1"}}
+  await store.create_puzzle(123, 456, "2025-01-01", "metrocryptic", grid.width, grid.height, grid, clues)
+
+  first = await store.get_puzzle_state(123)
+  second = await store.get_puzzle_state(123)
+  first["cells"].set_letter(0, 0, "S")
+  second["cells"].set_letter(1, 0, "A")
+
+  assert await store.update_puzzle_cells(123, first, [(0, 0)], [], expected_version=0)
+  assert first["version"] == 1
+  assert not await store.update_puzzle_cells(123, second, [(1, 0)], [], expected_version=0)
+  assert await store.update_puzzle_state(123, second["cells"], second["clues"], expected_version=0) is None
+
+  stored = await store.get_puzzle_state(123)
+  assert stored["version"] == 1
+  assert stored["cells"].letter(0, 0) == "S"
+  assert stored["cells"].letter(1, 0) == ""
+  await store.close()
+
+
+async def test_subscriptions_wait_until_posted(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+  clues = {"1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": "", "num": "1"}}
+
+  assert await store.add_subscription(10, 1, "metrocryptic")
+  assert await store.add_subscription(20, 1, "metrocryptic")
+  assert not await store.add_subscription(20, 1, "metrocryptic")
+  await store.add_subscription(30, 1, "othersource")
+  assert await store.get_unposted_subscriptions("2025-01-01", "metrocryptic") == [10, 20]
+
+  # Posted today, or from yesterday's thread, doesn't count
+  await store.create_puzzle(123, 10, "2025-01-01", "metrocryptic", grid.width, grid.height, grid, clues)
+  await store.create_puzzle(124, 20, "2024-12-31", "metrocryptic", grid.width, grid.height, grid, clues)
+  assert await store.get_unposted_subscriptions("2025-01-01", "metrocryptic") == [20]
+
+  assert await store.remove_subscription(20, "metrocryptic")
+  assert not await store.remove_subscription(20, "metrocryptic")
+  assert db.get_unposted_subscriptions("2025-01-01", "metrocryptic") == []
+  await store.close()
+
+
+async def test_previous_clue_texts_come_from_the_latest_earlier_puzzle(puzzle_db, sample_grid):
+  store = db.AsyncDatabase()
+  grid = sample_grid
+
+  def clues(text):
+    return {"1A": {"start": [0, 0], "lengths": [4, 2], "status": "unsolved", "direction": "A", "text": text, "num": "1"}}
+
+  assert await store.get_previous_clue_texts("metrocryptic", "2025-01-02") is None
+  await store.create_puzzle(1, 10, "2024-12-31", "metrocryptic", grid.width, grid.height, grid.copy(), clues("Older"))
+  await store.create_puzzle(2, 10, "2025-01-01", "metrocryptic", grid.width, grid.height, grid.copy(), clues("Latest"))
+  await store.create_puzzle(3, 10, "2025-01-02", "metrocryptic", grid.width, grid.height, grid.copy(), clues("Today"))
+  await store.create_puzzle(4, 10, "2025-01-01", "othersource", grid.width, grid.height, grid.copy(), clues("Other"))
+
+  assert await store.get_previous_clue_texts("metrocryptic", "2025-01-02") == {"1A": "Latest"}
+  assert db.get_previous_clue_texts("othersource", "2025-01-02") == {"1A": "Other"}
+  await store.close()